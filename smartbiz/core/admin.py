@@ -1,7 +1,10 @@
 from django.contrib import admin
-from .models import SubscriptionPlan, Subscription, Product, Sale
+from .models import SubscriptionPlan, Subscription, Product, Sale, DailySales, StockAlert, UserStats
 
 admin.site.register(SubscriptionPlan)
 admin.site.register(Subscription)
 admin.site.register(Product)
 admin.site.register(Sale)
+admin.site.register(DailySales)
+admin.site.register(StockAlert)
+admin.site.register(UserStats)
@@ -0,0 +1,79 @@
+from django.utils import timezone
+
+from .models import StockAlert
+from .stats import adjust_user_stats
+
+
+def stock_level(quantity, reorder_level):
+    """The alert level for a stock quantity, or None when stock is healthy"""
+    if quantity == 0:
+        return StockAlert.OUT
+    if quantity < reorder_level:
+        return StockAlert.LOW
+    return None
+
+
+def raise_stock_alert(product, level, previous=None):
+    """Open the product's alert, or escalate it from `previous`, in a single upsert"""
+    StockAlert.objects.bulk_create(
+        [StockAlert(user_id=product.user_id, product=product, level=level)],
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["level", "raised_at"],
+    )
+    adjust_user_stats(product.user_id, levels={level: 1, previous: -1})
+
+
+def sync_stock_alerts(products, new=False):
+    """Bring the alerts for `products` in line with their current stock.
+
+    Only products whose level actually changed are written: one SELECT for
+    the existing alerts (skipped for `new` products, which have none), then
+    at most one INSERT, one UPDATE per level and one DELETE, plus one
+    UserStats update per owner whose counts moved.
+    """
+    wanted = {product.pk: product for product in products}
+    if not wanted:
+        return
+    existing = {} if new else dict(
+        StockAlert.objects.filter(product_id__in=wanted).values_list("product_id", "level")
+    )
+
+    to_create, to_change, to_clear = [], {}, []
+    level_changes = {}
+    for pk, product in wanted.items():
+        level = stock_level(product.quantity, product.reorder_level)
+        current = existing.get(pk)
+        if level == current:
+            continue
+        changes = level_changes.setdefault(product.user_id, {})
+        changes[level] = changes.get(level, 0) + 1
+        changes[current] = changes.get(current, 0) - 1
+        if level is None:
+            to_clear.append(pk)
+        elif current is None:
+            to_create.append(StockAlert(user_id=product.user_id, product=product, level=level))
+        else:
+            to_change.setdefault(level, []).append(pk)
+
+    if to_create:
+        StockAlert.objects.bulk_create(to_create)
+    for level, pks in to_change.items():
+        StockAlert.objects.filter(product_id__in=pks).update(level=level, raised_at=timezone.now())
+    if to_clear:
+        StockAlert.objects.filter(product_id__in=to_clear).delete()
+    for user_id, changes in level_changes.items():
+        adjust_user_stats(user_id, levels=changes)
+
+
+def repair_stock_alerts(products, batch_size=500):
+    """Re-sync the alerts of every product in the `products` queryset, a batch at a time"""
+    products = products.only("user_id", "quantity", "reorder_level").order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        sync_stock_alerts(batch)
+        last_pk = batch[-1].pk
+
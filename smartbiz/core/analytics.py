@@ -0,0 +1,279 @@
+import asyncio
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Sale, Subscription
+from .stats import aget_user_stats, get_user_stats
+
+
+def _zero_nulls(totals):
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def _sales_summary_query(user, today=None):
+    today = today or timezone.now().date()
+    seven_days_ago = today - timedelta(days=7)
+    thirty_days_ago = today - timedelta(days=30)
+
+    is_today = Q(date=today)
+    in_week = Q(date__gte=seven_days_ago)
+    in_month = Q(date__gte=thirty_days_ago)
+
+    return DailySales.objects.filter(user=user), dict(
+        total_today=Sum("revenue", filter=is_today),
+        total_week=Sum("revenue", filter=in_week),
+        total_month=Sum("revenue", filter=in_month),
+        total_all_time=Sum("revenue"),
+        sales_count_today=Sum("transactions", filter=is_today),
+        sales_count_week=Sum("transactions", filter=in_week),
+        all_time_transactions=Sum("transactions"),
+    )
+
+
+def get_sales_summary(user, today=None):
+    """Period totals and transaction counts in a single aggregate over the rollup"""
+    rollups, aggregates = _sales_summary_query(user, today)
+    return _zero_nulls(rollups.aggregate(**aggregates))
+
+
+async def aget_sales_summary(user, today=None):
+    rollups, aggregates = _sales_summary_query(user, today)
+    return _zero_nulls(await rollups.aaggregate(**aggregates))
+
+
+def _stock_summary(stats):
+    return {
+        "product_count": stats.product_count,
+        "low_stock_count": stats.low_stock_count,
+        "out_of_stock": stats.out_of_stock_count,
+    }
+
+
+def get_stock_summary(user):
+    """Product counts per stock bucket, read from the user's running counts"""
+    return _stock_summary(get_user_stats(user))
+
+
+async def aget_stock_summary(user):
+    return _stock_summary(await aget_user_stats(user))
+
+
+def _daily_sales_query(user, start):
+    return (
+        DailySales.objects.filter(user=user, date__gte=start)
+        .values("date")
+        .annotate(total=Sum("revenue"))
+        .order_by()
+    )
+
+
+def _fill_days(rows, start, days):
+    totals = {row["date"]: row["total"] for row in rows}
+    daily_sales = {}
+    for i in range(days):
+        date = start + timedelta(days=i)
+        daily_sales[date.strftime("%a")] = totals.get(date) or 0
+    return daily_sales
+
+
+def get_daily_sales(user, today=None, days=7):
+    """Revenue per day for the last `days` days, oldest first, keyed by weekday"""
+    today = today or timezone.now().date()
+    start = today - timedelta(days=days - 1)
+    return _fill_days(_daily_sales_query(user, start), start, days)
+
+
+async def aget_daily_sales(user, today=None, days=7):
+    today = today or timezone.now().date()
+    start = today - timedelta(days=days - 1)
+    rows = [row async for row in _daily_sales_query(user, start)]
+    return _fill_days(rows, start, days)
+
+
+def get_top_products(user, limit=5):
+    """Best selling products by revenue"""
+    return (
+        DailySales.objects.filter(user=user)
+        .values("product__name")
+        .annotate(total_sold=Sum("units"), revenue=Sum("revenue"))
+        .order_by("-revenue")[:limit]
+    )
+
+
+async def aget_top_products(user, limit=5):
+    return [row async for row in get_top_products(user, limit)]
+
+
+def _sales_totals_query(user, start=None, end=None, product_id=None):
+    rollups = DailySales.objects.filter(user=user)
+    if start:
+        rollups = rollups.filter(date__gte=start)
+    if end:
+        rollups = rollups.filter(date__lte=end)
+    if product_id:
+        rollups = rollups.filter(product_id=product_id)
+    return rollups, dict(total_revenue=Sum("revenue"), transactions=Sum("transactions"))
+
+
+def _with_average(totals):
+    totals = _zero_nulls(totals)
+    transactions = totals["transactions"]
+    totals["average_sale"] = round(totals["total_revenue"] / transactions, 2) if transactions else 0
+    return totals
+
+
+def get_sales_totals(user, start=None, end=None, product_id=None):
+    """Revenue and transaction totals for a filtered history, in one aggregate over the rollup"""
+    rollups, aggregates = _sales_totals_query(user, start, end, product_id)
+    return _with_average(rollups.aggregate(**aggregates))
+
+
+async def aget_sales_totals(user, start=None, end=None, product_id=None):
+    rollups, aggregates = _sales_totals_query(user, start, end, product_id)
+    return _with_average(await rollups.aaggregate(**aggregates))
+
+
+def _add_to_rollup(user_id, product_id, date, units, revenue, transactions):
+    increments = {
+        "units": F("units") + units,
+        "revenue": F("revenue") + revenue,
+        "transactions": F("transactions") + transactions,
+    }
+    rollup = DailySales.objects.filter(user_id=user_id, product_id=product_id, date=date)
+    if rollup.update(**increments):
+        return
+
+    try:
+        with transaction.atomic():
+            DailySales.objects.create(
+                user_id=user_id,
+                product_id=product_id,
+                date=date,
+                units=units,
+                revenue=revenue,
+                transactions=transactions,
+            )
+    except IntegrityError:
+        # Another request created the day's row first
+        rollup.update(**increments)
+
+
+def add_sale_to_rollup(sale):
+    """Fold a newly recorded sale into its DailySales row.
+
+    Call inside the transaction that created the sale so the rollup never
+    drifts from the Sale table.
+    """
+    _add_to_rollup(
+        sale.user_id, sale.product_id, timezone.localdate(sale.created_at),
+        sale.quantity_sold, sale.total_price, 1,
+    )
+
+
+def add_sales_to_rollup(sales):
+    """Fold a batch of new sales into the rollup with one write per product and day"""
+    totals = {}
+    for sale in sales:
+        key = (sale.user_id, sale.product_id, timezone.localdate(sale.created_at))
+        units, revenue, transactions = totals.get(key, (0, 0, 0))
+        totals[key] = (units + sale.quantity_sold, revenue + sale.total_price, transactions + 1)
+    for (user_id, product_id, date), row in totals.items():
+        _add_to_rollup(user_id, product_id, date, *row)
+
+
+def daily_sales_from_sales(queryset=None):
+    """Aggregate raw Sale rows into rollup-shaped dicts, the source of truth for backfills"""
+    queryset = Sale.objects.all() if queryset is None else queryset
+    return (
+        queryset.annotate(date=TruncDate("created_at"))
+        .values("user_id", "product_id", "date")
+        .annotate(
+            units=Sum("quantity_sold"),
+            revenue=Sum("total_price"),
+            transactions=Count("id"),
+        )
+        .order_by("user_id", "product_id", "date")
+    )
+
+
+PLATFORM_METRICS_CACHE_KEY = "platform-metrics"
+
+
+def _platform_metrics_queries(today=None):
+    today = today or timezone.now().date()
+    due_date = today + timedelta(days=7)
+
+    owners = User.objects.filter(is_staff=False, is_superuser=False), dict(
+        total_users=Count("id"),
+        active_users=Count("id", filter=Q(is_active=True)),
+        inactive_users=Count("id", filter=Q(is_active=False)),
+    )
+    subscriptions = Subscription.objects.all(), dict(
+        total_subscriptions=Count("id"),
+        active_subscriptions=Count("id", filter=Q(is_active=True)),
+        expired_subscriptions=Count("id", filter=Q(is_active=False)),
+        total_revenue=Sum("plan__price", filter=Q(is_active=True)),
+        due_subscriptions=Count(
+            "id", filter=Q(is_active=True, end_date__lte=due_date, end_date__gte=today)
+        ),
+    )
+    return owners, subscriptions
+
+
+def _platform_metrics(owner_totals, subscription_totals):
+    metrics = {**owner_totals, **subscription_totals}
+    metrics["total_revenue"] = metrics["total_revenue"] or 0
+    metrics["generated_at"] = timezone.now()
+    return metrics
+
+
+def compute_platform_metrics(today=None):
+    """Admin dashboard figures: one aggregate over business owners, one over subscriptions"""
+    (owners, owner_aggregates), (subscriptions, subscription_aggregates) = _platform_metrics_queries(today)
+    return _platform_metrics(
+        owners.aggregate(**owner_aggregates),
+        subscriptions.aggregate(**subscription_aggregates),
+    )
+
+
+async def acompute_platform_metrics(today=None):
+    (owners, owner_aggregates), (subscriptions, subscription_aggregates) = _platform_metrics_queries(today)
+    return _platform_metrics(*await asyncio.gather(
+        owners.aaggregate(**owner_aggregates),
+        subscriptions.aaggregate(**subscription_aggregates),
+    ))
+
+
+def refresh_platform_metrics():
+    """Recompute the admin metrics and store them as the cached snapshot"""
+    metrics = compute_platform_metrics()
+    cache.set(PLATFORM_METRICS_CACHE_KEY, metrics, settings.PLATFORM_METRICS_CACHE_TIMEOUT)
+    return metrics
+
+
+def get_platform_metrics():
+    """The cached admin metrics snapshot, computed on first use"""
+    metrics = cache.get(PLATFORM_METRICS_CACHE_KEY)
+    if metrics is None:
+        metrics = refresh_platform_metrics()
+    return metrics
+
+
+async def arefresh_platform_metrics():
+    metrics = await acompute_platform_metrics()
+    await cache.aset(PLATFORM_METRICS_CACHE_KEY, metrics, settings.PLATFORM_METRICS_CACHE_TIMEOUT)
+    return metrics
+
+
+async def aget_platform_metrics():
+    metrics = await cache.aget(PLATFORM_METRICS_CACHE_KEY)
+    if metrics is None:
+        metrics = await arefresh_platform_metrics()
+    return metrics
@@ -0,0 +1,412 @@
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import transaction
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .alerts import sync_stock_alerts
+from .analytics import get_daily_sales, get_sales_summary, get_stock_summary, get_top_products
+from .imports import parse_product_row
+from .inventory import InsufficientStock, record_offline_sales, sell_product
+from .models import Product, Sale
+from .pagination import keyset_page
+from .stats import adjust_user_stats, product_allowance
+from .utils import (
+    ENTITLEMENT_ACTIVE,
+    STOCK_FILTERS,
+    bump_data_version,
+    date_range_q,
+    get_data_version,
+    get_date_range,
+    get_entitlement,
+    get_page_size,
+    invalidate_notifications,
+    prefix_q,
+)
+
+PRODUCT_FIELDS = ("name", "quantity", "reorder_level", "buying_price", "selling_price")
+
+
+def basic_auth_user(request):
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    scheme, _, credentials = header.partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        username, _, password = base64.b64decode(credentials).decode().partition(":")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return authenticate(request, username=username, password=password)
+
+
+def api_view(view_func):
+    """Authenticate an API request and require an active subscription.
+
+    Integrations authenticate with HTTP Basic credentials; browser sessions
+    work too, but unsafe methods then need a valid CSRF token.
+    """
+    @csrf_exempt
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        basic_user = basic_auth_user(request)
+        if basic_user is not None:
+            request.user = basic_user
+        elif request.user.is_authenticated:
+            if request.method not in ("GET", "HEAD", "OPTIONS"):
+                rejected = CsrfViewMiddleware(lambda r: None).process_view(request, None, (), {})
+                if rejected is not None:
+                    return api_error("CSRF verification failed", status=403)
+        else:
+            response = api_error("Authentication required", status=401)
+            response["WWW-Authenticate"] = 'Basic realm="SmartBiz API"'
+            return response
+
+        user = request.user
+        if not (user.is_staff or user.is_superuser) and get_entitlement(user) != ENTITLEMENT_ACTIVE:
+            return api_error("An active subscription is required", status=402)
+
+        return view_func(request, *args, **kwargs)
+
+    return _wrapped_view
+
+
+def api_error(message, status=400, **extra):
+    return JsonResponse({"error": message, **extra}, status=status)
+
+
+def _etag(request, *args, **kwargs):
+    """Changes whenever the user's products or sales change, or the query or day changes"""
+    version = get_data_version(request.user.pk)
+    key = f"{request.user.pk}:{version}:{timezone.now().date()}:{request.get_full_path()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(get_data_version(request.user.pk), tz=dt_timezone.utc)
+
+
+conditional_get = condition(etag_func=_etag, last_modified_func=_last_modified)
+
+
+def _read_items(request, key):
+    """The list under `key` in a JSON request body, or an error response"""
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return None, api_error("Request body must be JSON")
+    items = payload.get(key) if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None, api_error(f'Request body must be {{"{key}": [{{...}}, ...]}}')
+    if len(items) > settings.API_MAX_BATCH_SIZE:
+        return None, api_error(f"At most {settings.API_MAX_BATCH_SIZE} items per request")
+    return items, None
+
+
+def _is_whole_number(value):
+    # JSON true/false arrive as bool, which is a subclass of int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_id(value):
+    """Whether `value` can be a primary key: a positive whole number that fits a BIGINT"""
+    return _is_whole_number(value) and 0 < value < 2 ** 63
+
+
+def _field_text(row, field):
+    """A product field as the text parse_product_row expects; null counts as missing"""
+    value = row.get(field)
+    if value is None:
+        return ""
+    if isinstance(value, (str, int, float, Decimal)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"{field} must be a string or a number")
+
+
+class BatchError(Exception):
+    """Aborts a batch: the item at `index` cannot be applied"""
+
+    def __init__(self, index, message, status=400):
+        super().__init__(message)
+        self.index = index
+        self.status = status
+
+    def as_json(self):
+        return {"index": self.index, "error": str(self)}
+
+
+def product_json(product):
+    return {
+        "id": product.id,
+        "name": product.name,
+        "quantity": product.quantity,
+        "reorder_level": product.reorder_level,
+        "buying_price": product.buying_price,
+        "selling_price": product.selling_price,
+        "created_at": product.created_at,
+    }
+
+
+def sale_json(sale):
+    return {
+        "id": sale.id,
+        "product_id": sale.product_id,
+        "product_name": sale.product.name,
+        "quantity_sold": sale.quantity_sold,
+        "total_price": sale.total_price,
+        "created_at": sale.created_at,
+    }
+
+
+@api_view
+@require_GET
+@conditional_get
+def products(request):
+    """GET: one page of products, with the same ?q= and ?stock= filters as the product list"""
+    queryset = Product.objects.filter(user=request.user)
+    query = request.GET.get("q", "").strip()
+    if query:
+        queryset = queryset.filter(prefix_q("name_lower", query.lower()))
+    stock_filter = request.GET.get("stock")
+    if stock_filter in STOCK_FILTERS:
+        queryset = queryset.filter(STOCK_FILTERS[stock_filter])
+
+    page, next_cursor = keyset_page(
+        queryset, ("name_lower", "id"),
+        cursor=request.GET.get("cursor"),
+        page_size=get_page_size(request),
+    )
+    return JsonResponse({"results": [product_json(p) for p in page], "next_cursor": next_cursor})
+
+
+@api_view
+@require_POST
+def products_batch(request):
+    """POST {"products": [...]}: items with an "id" are updated, the rest created.
+
+    The whole batch is validated first and written in one transaction, so
+    either every item is applied or none is.
+    """
+    items, error = _read_items(request, "products")
+    if error:
+        return error
+
+    ids = [item["id"] for item in items if _is_id(item.get("id"))]
+    existing = Product.objects.filter(user=request.user).in_bulk(ids) if ids else {}
+
+    to_create, to_update, errors = [], [], []
+    update_fields = set()
+    for index, item in enumerate(items):
+        if "id" in item:
+            if not _is_id(item["id"]):
+                errors.append({"index": index, "error": "id must be a positive whole number"})
+                continue
+            product = existing.get(item["id"])
+            if product is None:
+                errors.append({"index": index, "error": "product not found"})
+                continue
+            row = {field: getattr(product, field) for field in PRODUCT_FIELDS}
+            row.update({f: item[f] for f in PRODUCT_FIELDS if f in item})
+        else:
+            row = item
+        try:
+            fields = parse_product_row({f: _field_text(row, f) for f in PRODUCT_FIELDS})
+        except ValueError as exc:
+            errors.append({"index": index, "error": str(exc)})
+            continue
+        if "id" in item:
+            supplied = [f for f in PRODUCT_FIELDS if f in item]
+            if "name" in supplied:
+                supplied.append("name_lower")
+            for field in supplied:
+                setattr(product, field, fields[field])
+            update_fields.update(supplied)
+            to_update.append(product)
+        else:
+            to_create.append(Product(user=request.user, **fields))
+
+    if errors:
+        return api_error("No products were saved", errors=errors)
+
+    with transaction.atomic():
+        allowance = product_allowance(request.user) if to_create else None
+        if allowance is not None and len(to_create) > allowance:
+            return api_error(
+                f"Your plan allows {allowance} more product(s); no products were saved", status=403
+            )
+        created = Product.objects.bulk_create(to_create)
+        sync_stock_alerts(created, new=True)
+        adjust_user_stats(request.user.pk, products=len(created))
+        if update_fields:
+            # Only write supplied columns so a batch rename cannot undo a concurrent sale
+            Product.objects.bulk_update(to_update, sorted(update_fields))
+            if update_fields & {"quantity", "reorder_level"}:
+                sync_stock_alerts(to_update)
+
+    # Bulk writes send no post_save signals
+    invalidate_notifications(request.user.pk)
+    bump_data_version(request.user.pk)
+    return JsonResponse({
+        "created": [product_json(p) for p in created],
+        "updated": [product_json(p) for p in to_update],
+    })
+
+
+@api_view
+@require_GET
+@conditional_get
+def sales(request):
+    """GET: one page of sales, newest first, filtered by ?start=, ?end= and ?product="""
+    start, end = get_date_range(request)
+    queryset = Sale.objects.filter(date_range_q(start, end), user=request.user)
+    product_id = request.GET.get("product", "")
+    if product_id.isdigit():
+        queryset = queryset.filter(product_id=int(product_id))
+
+    page, next_cursor = keyset_page(
+        queryset.select_related("product"), ("-created_at", "-id"),
+        cursor=request.GET.get("cursor"),
+        page_size=get_page_size(request),
+    )
+    return JsonResponse({"results": [sale_json(s) for s in page], "next_cursor": next_cursor})
+
+
+@api_view
+@require_POST
+def sales_batch(request):
+    """POST {"sales": [{"product_id": ..., "quantity_sold": ...}, ...]}: all or nothing"""
+    items, error = _read_items(request, "sales")
+    if error:
+        return error
+
+    products_by_id = Product.objects.filter(user=request.user).in_bulk(
+        {item.get("product_id") for item in items if _is_id(item.get("product_id"))}
+    )
+
+    created = []
+    try:
+        with transaction.atomic():
+            for index, item in enumerate(items):
+                product_id = item.get("product_id")
+                quantity_sold = item.get("quantity_sold")
+                if not _is_id(product_id):
+                    raise BatchError(index, "product_id must be a positive whole number")
+                product = products_by_id.get(product_id)
+                if product is None:
+                    raise BatchError(index, "product not found")
+                if not _is_whole_number(quantity_sold) or quantity_sold <= 0:
+                    raise BatchError(index, "quantity_sold must be a positive whole number")
+                try:
+                    sale = sell_product(product, quantity_sold)
+                except InsufficientStock as exc:
+                    raise BatchError(index, str(exc), status=409)
+                created.append(sale)
+    except BatchError as exc:
+        return api_error("No sales were recorded", status=exc.status, errors=[exc.as_json()])
+
+    return JsonResponse({"created": [sale_json(s) for s in created]})
+
+
+def _parse_offline_sale(item, now):
+    """The validated fields of one offline sale, or raise ValueError"""
+    key = item.get("key")
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        raise ValueError("key must be a string of 1 to 64 characters")
+    product_id = item.get("product_id")
+    if not _is_id(product_id):
+        raise ValueError("product_id must be a positive whole number")
+    quantity_sold = item.get("quantity_sold")
+    if not _is_whole_number(quantity_sold) or quantity_sold <= 0:
+        raise ValueError("quantity_sold must be a positive whole number")
+    try:
+        sold_at = parse_datetime(item.get("sold_at") or "")
+    except (TypeError, ValueError):
+        sold_at = None
+    if sold_at is None:
+        raise ValueError("sold_at must be an ISO 8601 date and time")
+    if timezone.is_naive(sold_at):
+        sold_at = timezone.make_aware(sold_at)
+    if sold_at > now + timedelta(seconds=settings.SALE_SYNC_CLOCK_SKEW):
+        raise ValueError("sold_at is in the future")
+    if sold_at < now - timedelta(days=settings.SALE_SYNC_MAX_AGE_DAYS):
+        raise ValueError(f"sold_at is more than {settings.SALE_SYNC_MAX_AGE_DAYS} days ago")
+    return {"key": key, "product_id": product_id, "quantity_sold": quantity_sold, "sold_at": sold_at}
+
+
+@api_view
+@require_POST
+def sales_sync(request):
+    """POST {"sales": [{"key": ..., "product_id": ..., "quantity_sold": ..., "sold_at": ...}, ...]}
+
+    Uploads sales queued on a device while offline. Each sale carries a
+    client-generated key; a key that was already recorded is reported as a
+    duplicate with its original sale, so a retried upload never counts a
+    sale twice. Unlike sales_batch, items succeed or fail independently and
+    the response has one result per item, in request order.
+    """
+    items, error = _read_items(request, "sales")
+    if error:
+        return error
+
+    now = timezone.now()
+    results, entries, positions, first_index = [], [], [], {}
+    for index, item in enumerate(items):
+        result = {"index": index, "key": item.get("key")}
+        results.append(result)
+        try:
+            entry = _parse_offline_sale(item, now)
+        except ValueError as exc:
+            result.update(status="rejected", error=str(exc))
+            continue
+        if entry["key"] in first_index:
+            # Resolved below from the first item with the same key
+            continue
+        first_index[entry["key"]] = index
+        entries.append(entry)
+        positions.append(index)
+
+    created = False
+    for index, (status, outcome) in zip(positions, record_offline_sales(request.user, entries)):
+        created = created or status == "created"
+        if status == "rejected":
+            results[index].update(status=status, error=outcome)
+        else:
+            results[index].update(status=status, sale=sale_json(outcome))
+    for result in results:
+        if "status" not in result:
+            first = results[first_index[result["key"]]]
+            result.update({k: v for k, v in first.items() if k not in ("index", "key")})
+            if first["status"] == "created":
+                result["status"] = "duplicate"
+
+    if created:
+        # Bulk writes send no post_save signals
+        invalidate_notifications(request.user.pk)
+        bump_data_version(request.user.pk)
+    return JsonResponse({"results": results})
+
+
+@api_view
+@require_GET
+@conditional_get
+def dashboard(request):
+    """GET: the dashboard's headline metrics"""
+    today = timezone.now().date()
+    return JsonResponse({
+        "date": today,
+        "sales": get_sales_summary(request.user, today),
+        "stock": get_stock_summary(request.user),
+        "daily_sales": get_daily_sales(request.user, today),
+        "top_products": list(get_top_products(request.user)),
+    })
@@ -0,0 +1,161 @@
+"""Async versions of the read-heavy pages, served by the ASGI entry point.
+
+Each view starts its independent queries together with asyncio.gather and
+materializes every queryset before rendering, so the template (which runs
+in a worker thread via sync_to_async) never has to wait on the database.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .analytics import (
+    aget_daily_sales,
+    aget_platform_metrics,
+    aget_sales_summary,
+    aget_sales_totals,
+    aget_stock_summary,
+    aget_top_products,
+    arefresh_platform_metrics,
+)
+from .exports import PRODUCTS_HEADER, SALES_HEADER, acsv_response, product_rows, sales_rows
+from .forecasting import reorder_suggestions
+from .models import Product
+from .pagination import akeyset_page
+from .routers import replica_reads
+from .utils import dashboard_cache_key, get_data_version, get_date_range, get_page_size, subscription_required
+from .views import (
+    admin_required,
+    dashboard_context,
+    product_list_filters,
+    sales_history_filters,
+    sales_history_products,
+    store_dashboard_body,
+    todays_sales,
+)
+
+arender = sync_to_async(render)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@login_required
+@subscription_required
+@replica_reads
+async def dashboard(request):
+    user = await request.auser()
+    today = timezone.now().date()
+    version = await sync_to_async(get_data_version)(user.id)
+    key = dashboard_cache_key(user.id, version, today)
+    body = await cache.aget(key)
+    if body is not None:
+        return await arender(request, "core/dashboard.html", {"dashboard_body": body})
+
+    summary, stock, top_products, daily_sales, sales_today, suggestions = await asyncio.gather(
+        aget_sales_summary(user, today),
+        aget_stock_summary(user),
+        aget_top_products(user),
+        aget_daily_sales(user, today),
+        _alist(todays_sales(user, today)),
+        _alist(reorder_suggestions(user)),
+    )
+    context = dashboard_context(
+        summary=summary,
+        stock=stock,
+        top_products=top_products,
+        daily_sales=daily_sales,
+        sales_today=sales_today,
+        products=Product.objects.filter(user=user),
+        reorder_suggestions=suggestions,
+    )
+    body = await sync_to_async(render_to_string)("core/dashboard_body.html", context, request)
+    await sync_to_async(store_dashboard_body)(key, version, body)
+    return await arender(request, "core/dashboard.html", {"dashboard_body": body})
+
+
+@login_required
+@subscription_required
+async def product_list(request):
+    user = await request.auser()
+    products, filters = product_list_filters(user, request.GET)
+    page_size = get_page_size(request)
+    page, next_cursor = await akeyset_page(
+        products,
+        ("name_lower", "id"),
+        cursor=request.GET.get("cursor"),
+        page_size=page_size,
+    )
+
+    context = {
+        "products": page,
+        "next_cursor": next_cursor,
+        "is_first_page": not request.GET.get("cursor"),
+        "page_size": page_size,
+        **filters,
+    }
+    return await arender(request, "core/product_list.html", context)
+
+
+@login_required
+@subscription_required
+@replica_reads
+async def sales_history(request):
+    user = await request.auser()
+    sales, filters = sales_history_filters(user, request)
+    page_size = get_page_size(request, settings.SALES_HISTORY_PAGE_SIZE)
+    (page, next_cursor), products, totals = await asyncio.gather(
+        akeyset_page(
+            sales,
+            ("-created_at", "-id"),
+            cursor=request.GET.get("cursor"),
+            page_size=page_size,
+        ),
+        _alist(sales_history_products(user)),
+        aget_sales_totals(user, filters["start"], filters["end"], filters["product_id"]),
+    )
+
+    context = {
+        "sales": page,
+        "next_cursor": next_cursor,
+        "is_first_page": not request.GET.get("cursor"),
+        "page_size": page_size,
+        **filters,
+        "products": products,
+        **totals,
+    }
+    return await arender(request, "core/sales_history.html", context)
+
+
+@login_required
+@admin_required
+@replica_reads
+async def admin_dashboard(request):
+    """Admin dashboard with statistics"""
+    if request.GET.get("refresh"):
+        metrics = await arefresh_platform_metrics()
+    else:
+        metrics = await aget_platform_metrics()
+    return await arender(request, "core/admin_dashboard.html", metrics)
+
+
+@login_required
+@subscription_required
+async def export_sales(request):
+    user = await request.auser()
+    start, end = get_date_range(request)
+    return acsv_response("sales.csv", SALES_HEADER, sales_rows(user, start, end))
+
+
+@login_required
+@subscription_required
+async def export_products(request):
+    user = await request.auser()
+    start, end = get_date_range(request)
+    return acsv_response("products.csv", PRODUCTS_HEADER, product_rows(user, start, end))
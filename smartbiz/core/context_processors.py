@@ -1,8 +1,9 @@
+from django.utils.functional import SimpleLazyObject
 from .utils import get_notifications
 
 
 def notifications_processor(request):
-    """Add notifications to template context"""
+    """Add notifications to template context, computed only if a template reads them"""
     return {
-        "notifications": get_notifications(request)
+        "notifications": SimpleLazyObject(lambda: get_notifications(request))
     }
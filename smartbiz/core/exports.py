@@ -0,0 +1,75 @@
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from .models import Product, Sale
+from .utils import date_range_q
+
+EXPORT_CHUNK_SIZE = 2000
+SALES_HEADER = ["created_at", "product", "quantity_sold", "total_price"]
+PRODUCTS_HEADER = ["name", "quantity", "buying_price", "selling_price", "created_at"]
+
+
+class Echo:
+    """File-like object whose write() hands the line straight back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(filename, header, rows):
+    """Stream the `rows` queryset as a CSV download, one line at a time"""
+    writer = csv.writer(Echo())
+    lines = (writer.writerow(row) for row in _with_header(header, rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)))
+    return _attachment(lines, filename)
+
+
+def acsv_response(filename, header, rows):
+    """csv_response for async views.
+
+    ASGI reads a sync iterator into memory before sending any of it, so
+    here the response is an async iterator that fetches one chunk of rows
+    at a time in a worker thread and streams it before fetching the next.
+    """
+    rows = rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+
+    async def lines():
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+        while chunk := await next_chunk():
+            for row in chunk:
+                yield writer.writerow(row)
+
+    return _attachment(lines(), filename)
+
+
+def _attachment(lines, filename):
+    response = StreamingHttpResponse(lines, content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _with_header(header, rows):
+    yield header
+    yield from rows
+
+
+def sales_rows(user, start=None, end=None):
+    """A user's sales, oldest first, in SALES_HEADER order"""
+    return (
+        Sale.objects.filter(date_range_q(start, end), user=user)
+        .order_by("created_at", "id")
+        .values_list("created_at", "product__name", "quantity_sold", "total_price")
+    )
+
+
+def product_rows(user, start=None, end=None):
+    """A user's products in import column order"""
+    return (
+        Product.objects.filter(date_range_q(start, end), user=user)
+        .order_by("id")
+        .values_list("name", "quantity", "buying_price", "selling_price", "created_at")
+    )
@@ -0,0 +1,143 @@
+"""Demand forecasts and reorder suggestions, computed for products in batches.
+
+Each batch loads the DailySales history of up to FORECAST_BATCH_SIZE
+products as a products x days matrix, so memory depends on the batch size
+and history window rather than on the number of sales or tenants. Every
+statistic is a whole-matrix operation:
+
+- velocity: average units sold per day since the product was added (or
+  first sold), over at most FORECAST_HISTORY_DAYS;
+- forecast_daily: an exponentially weighted average of the same history,
+  weighting recent days most (smoothing factor FORECAST_SMOOTHING);
+- reorder_point: forecast demand over FORECAST_LEAD_TIME_DAYS plus safety
+  stock of FORECAST_SERVICE_Z standard deviations of daily demand;
+- reorder_quantity: forecast demand over FORECAST_ORDER_DAYS.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import CharField, F
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Product, StockForecast
+from .utils import bump_data_version
+
+FORECAST_FIELDS = ["velocity", "forecast_daily", "reorder_point", "reorder_quantity", "computed_at"]
+
+
+def subscriber_products(today=None):
+    """Products belonging to owners with a current subscription"""
+    today = today or timezone.now().date()
+    return Product.objects.filter(
+        user__subscription__is_active=True,
+        user__subscription__start_date__lte=today,
+        user__subscription__end_date__gte=today,
+    )
+
+
+def demand_matrix(product_ids, start, days):
+    """Units sold per product (rows, in product_ids order) per day from `start` (columns)"""
+    rows = list(
+        DailySales.objects.filter(
+            product_id__in=product_ids.tolist(),
+            date__gte=start,
+            date__lt=start + timedelta(days=days),
+        ).values_list("product_id", Cast("date", CharField()), "units")
+    )
+    matrix = np.zeros((len(product_ids), days))
+    if rows:
+        sale_products, dates, units = zip(*rows)
+        row = np.searchsorted(product_ids, np.array(sale_products, np.int64))
+        column = (np.array(dates, "datetime64[D]") - np.datetime64(start, "D")).astype(np.int64)
+        # The rollup holds one row per product and day
+        matrix[row, column] = units
+    return matrix
+
+
+def forecast_batch(product_ids, created, today):
+    """Velocity, smoothed daily forecast and reorder suggestion arrays for one batch"""
+    days = settings.FORECAST_HISTORY_DAYS
+    start = today - timedelta(days=days - 1)
+    matrix = demand_matrix(product_ids, start, days)
+
+    # Days before a product existed are not zero-demand days. Imported
+    # history can predate created_at, so a sale also marks the product as live.
+    first_day = np.clip(days - 1 - (np.datetime64(today, "D") - created).astype(np.int64), 0, days - 1)
+    sold = matrix > 0
+    first_day = np.where(sold.any(axis=1), np.minimum(first_day, sold.argmax(axis=1)), first_day)
+    age = days - first_day
+    observed = np.arange(days) >= first_day[:, None]
+
+    velocity = matrix.sum(axis=1) / age
+    variance = (np.where(observed, matrix - velocity[:, None], 0) ** 2).sum(axis=1) / age
+
+    # Normalised exponential weights, newest day weighted 1
+    weights = np.where(observed, (1 - settings.FORECAST_SMOOTHING) ** np.arange(days - 1, -1, -1), 0)
+    forecast_daily = (matrix * weights).sum(axis=1) / weights.sum(axis=1)
+
+    lead_time = settings.FORECAST_LEAD_TIME_DAYS
+    safety_stock = settings.FORECAST_SERVICE_Z * np.sqrt(variance * lead_time)
+    reorder_point = np.ceil(forecast_daily * lead_time + safety_stock)
+    reorder_quantity = np.ceil(forecast_daily * settings.FORECAST_ORDER_DAYS)
+    return velocity, forecast_daily, reorder_point.astype(np.int64), reorder_quantity.astype(np.int64)
+
+
+def forecast_products(products, today=None, batch_size=None):
+    """Compute and store forecasts for `products`, a batch at a time.
+
+    Batches are read by primary key, so each one is a cheap index range
+    scan and nothing larger than a batch is ever held in memory. Each batch
+    is written with one upsert, then its owners' data versions are bumped so
+    cached dashboards pick up the new suggestions. Returns the number of
+    products forecast.
+    """
+    today = today or timezone.now().date()
+    batch_size = batch_size or settings.FORECAST_BATCH_SIZE
+    now = timezone.now()
+    products = products.order_by("pk")
+    forecast = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            products.filter(pk__gt=last_pk).values_list("pk", "user_id", TruncDate("created_at"))[:batch_size]
+        )
+        if not batch:
+            return forecast
+
+        pks, user_ids, created = zip(*batch)
+        product_ids = np.array(pks, np.int64)
+        velocity, forecast_daily, reorder_point, reorder_quantity = forecast_batch(
+            product_ids, np.array(created, "datetime64[D]"), today
+        )
+        StockForecast.objects.bulk_create(
+            [
+                StockForecast(
+                    product_id=pk,
+                    user_id=user_id,
+                    velocity=round(float(velocity[i]), 3),
+                    forecast_daily=round(float(forecast_daily[i]), 3),
+                    reorder_point=int(reorder_point[i]),
+                    reorder_quantity=int(reorder_quantity[i]),
+                    computed_at=now,
+                )
+                for i, (pk, user_id) in enumerate(zip(pks, user_ids))
+            ],
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=FORECAST_FIELDS,
+        )
+        for user_id in set(user_ids):
+            bump_data_version(user_id)
+        forecast += len(batch)
+        last_pk = pks[-1]
+
+
+def reorder_suggestions(user, limit=5):
+    """The user's products at or below their reorder point, most urgent first"""
+    return (
+        StockForecast.objects.filter(user=user, reorder_point__gt=0, product__quantity__lte=F("reorder_point"))
+        .select_related("product")
+        .order_by("product__quantity", "-forecast_daily")[:limit]
+    )
@@ -0,0 +1,121 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .alerts import sync_stock_alerts
+from .models import DEFAULT_REORDER_LEVEL, Product
+from .stats import adjust_user_stats, product_allowance
+from .utils import bump_data_version, invalidate_notifications
+
+PRODUCT_IMPORT_COLUMNS = ("name", "quantity", "buying_price", "selling_price")
+# Read when present; missing or blank values get the default
+OPTIONAL_IMPORT_COLUMNS = ("reorder_level",)
+MAX_REPORTED_ERRORS = 100
+# Largest value every supported database stores in a PositiveIntegerField
+MAX_COUNT = 2147483647
+
+
+class ImportResult:
+    """Outcome of a bulk import: rows created plus the first few row errors"""
+
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def _parse_price(value, label):
+    try:
+        price = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"{label} must be a number")
+    if not price.is_finite() or price < 0:
+        raise ValueError(f"{label} must be zero or more")
+    if price.as_tuple().exponent < -2 or price >= Decimal("100000000"):
+        raise ValueError(f"{label} must have at most 8 digits and 2 decimal places")
+    return price
+
+
+def _parse_count(value, label, default):
+    try:
+        count = int((value or "").strip() or default)
+    except ValueError:
+        raise ValueError(f"{label} must be a whole number")
+    if count < 0:
+        raise ValueError(f"{label} must be zero or more")
+    if count > MAX_COUNT:
+        raise ValueError(f"{label} must be at most {MAX_COUNT}")
+    return count
+
+
+def parse_product_row(row):
+    """Validate one CSV row and return the Product field values"""
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    if len(name) > Product._meta.get_field("name").max_length:
+        raise ValueError("name is too long")
+
+    return {
+        "name": name,
+        "name_lower": name.lower(),
+        "quantity": _parse_count(row.get("quantity"), "quantity", 0),
+        "reorder_level": _parse_count(row.get("reorder_level"), "reorder_level", DEFAULT_REORDER_LEVEL),
+        "buying_price": _parse_price((row.get("buying_price") or "").strip(), "buying_price"),
+        "selling_price": _parse_price((row.get("selling_price") or "").strip(), "selling_price"),
+    }
+
+
+def _create_batch(user, batch, result):
+    sync_stock_alerts(Product.objects.bulk_create(batch), new=True)
+    adjust_user_stats(user.pk, products=len(batch))
+    result.created += len(batch)
+
+
+def import_products(user, lines, batch_size=500):
+    """Create products for `user` from an iterable of CSV text lines.
+
+    Rows are read one at a time and inserted with bulk_create every
+    `batch_size` valid rows, so memory stays flat however large the file
+    is. Invalid rows are skipped and reported by line number; the valid
+    ones are committed together in one transaction. Rows beyond the
+    user's plan limit are reported as errors.
+    """
+    result = ImportResult()
+    reader = csv.DictReader(lines)
+    missing = set(PRODUCT_IMPORT_COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        result.add_error(1, f"missing column(s): {', '.join(sorted(missing))}")
+        return result
+
+    batch = []
+    with transaction.atomic():
+        allowance = product_allowance(user)
+        for row in reader:
+            try:
+                fields = parse_product_row(row)
+            except ValueError as exc:
+                result.add_error(reader.line_num, str(exc))
+                continue
+            if allowance is not None:
+                if allowance == 0:
+                    result.add_error(reader.line_num, "your plan's product limit has been reached")
+                    continue
+                allowance -= 1
+            batch.append(Product(user=user, **fields))
+            if len(batch) >= batch_size:
+                _create_batch(user, batch, result)
+                batch = []
+        if batch:
+            _create_batch(user, batch, result)
+
+    # bulk_create sends no post_save signals
+    invalidate_notifications(user.pk)
+    bump_data_version(user.pk)
+    return result
@@ -0,0 +1,134 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .alerts import raise_stock_alert, stock_level, sync_stock_alerts
+from .analytics import add_sale_to_rollup, add_sales_to_rollup
+from .models import Product, Sale
+from .stats import adjust_user_stats
+
+
+class InsufficientStock(Exception):
+    """Raised when a sale asks for more units than the product has left"""
+
+
+def sell_product(product, quantity_sold):
+    """Record a sale and take the units out of stock atomically.
+
+    The stock check and decrement are one conditional UPDATE, so two
+    cashiers selling the last unit at the same moment cannot both succeed.
+    Only the quantity column is written, and the Sale insert, rollup
+    update and any stock alert it raises commit or roll back together
+    with it.
+    """
+    if quantity_sold <= 0:
+        raise ValueError("Quantity sold must be positive")
+
+    with transaction.atomic():
+        updated = Product.objects.filter(
+            pk=product.pk,
+            quantity__gte=quantity_sold,
+        ).update(quantity=F("quantity") - quantity_sold)
+        if not updated:
+            raise InsufficientStock(f"Not enough {product.name} in stock")
+
+        # A sale only lowers stock, so it can raise an alert but never clear one
+        product.refresh_from_db(fields=["quantity", "reorder_level"])
+        level = stock_level(product.quantity, product.reorder_level)
+        previous = stock_level(product.quantity + quantity_sold, product.reorder_level)
+        if level != previous:
+            raise_stock_alert(product, level, previous)
+
+        sale = Sale.objects.create(
+            user_id=product.user_id,
+            product=product,
+            quantity_sold=quantity_sold,
+            total_price=quantity_sold * product.selling_price,
+        )
+        add_sale_to_rollup(sale)
+
+    return sale
+
+
+def record_offline_sales(user, entries):
+    """Record sales captured offline, each at most once per idempotency key.
+
+    `entries` are validated dicts with "key", "product_id", "quantity_sold"
+    and "sold_at". Returns one (status, sale or error message) per entry,
+    where status is "created", "duplicate" or "rejected".
+
+    The batch is one transaction: the products are locked, keys already
+    recorded are returned as duplicates, and each product's remaining
+    sales are accepted oldest first while its stock lasts. Stock for every
+    product then drops in a single UPDATE, the sales go in with one INSERT,
+    the rollup gets one write per product and day and the owner's sale
+    count one increment.
+    """
+    try:
+        return _record_offline_sales(user, entries)
+    except IntegrityError:
+        # A concurrent upload of the same keys committed first; its sales are now duplicates
+        return _record_offline_sales(user, entries)
+
+
+def _record_offline_sales(user, entries):
+    results = [None] * len(entries)
+    with transaction.atomic():
+        # Lock before looking up keys so a concurrent retry waits and then sees our sales
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(user=user, pk__in={entry["product_id"] for entry in entries})
+            .order_by("pk")
+        }
+        recorded = {
+            sale.idempotency_key: sale
+            for sale in Sale.objects.filter(
+                user=user, idempotency_key__in=[entry["key"] for entry in entries]
+            ).select_related("product")
+        }
+
+        pending = {}
+        for index, entry in enumerate(entries):
+            if entry["key"] in recorded:
+                results[index] = ("duplicate", recorded[entry["key"]])
+            elif entry["product_id"] not in products:
+                results[index] = ("rejected", "product not found")
+            else:
+                pending.setdefault(entry["product_id"], []).append(index)
+
+        sold, to_create = {}, []
+        for product_id, indexes in pending.items():
+            product = products[product_id]
+            remaining = product.quantity
+            for index in sorted(indexes, key=lambda i: entries[i]["sold_at"]):
+                entry = entries[index]
+                if entry["quantity_sold"] > remaining:
+                    results[index] = ("rejected", f"Not enough {product.name} in stock")
+                    continue
+                remaining -= entry["quantity_sold"]
+                sale = Sale(
+                    user=user,
+                    product=product,
+                    quantity_sold=entry["quantity_sold"],
+                    total_price=entry["quantity_sold"] * product.selling_price,
+                    created_at=entry["sold_at"],
+                    idempotency_key=entry["key"],
+                )
+                results[index] = ("created", sale)
+                to_create.append(sale)
+            if remaining != product.quantity:
+                sold[product_id] = product.quantity - remaining
+                product.quantity = remaining
+
+        if sold:
+            Product.objects.filter(pk__in=sold).update(
+                quantity=F("quantity") - Case(
+                    *(When(pk=pk, then=Value(units)) for pk, units in sold.items()),
+                    output_field=IntegerField(),
+                )
+            )
+            Sale.objects.bulk_create(to_create)
+            add_sales_to_rollup(to_create)
+            adjust_user_stats(user.pk, sales=len(to_create))
+            sync_stock_alerts([products[pk] for pk in sold])
+    return results
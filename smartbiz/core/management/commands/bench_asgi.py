@@ -0,0 +1,102 @@
+import asyncio
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+ASYNC_URLCONF = 'smartbiz.urls_asgi'
+
+
+class Command(BaseCommand):
+    help = (
+        'Request the dashboard and analytics pages concurrently through the sync views '
+        '(threads, as under WSGI) and the async views (one event loop, as under ASGI) '
+        'and report throughput and p50/p99 latency for each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username to request the pages as')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per stack (default: 200)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight (default: 8)')
+        parser.add_argument(
+            '--views',
+            nargs='+',
+            default=['dashboard', 'sales_history', 'product_list'],
+            help='URL names to cycle through (default: dashboard sales_history product_list)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('An in-memory SQLite database cannot be shared between threads; use a file or server database.')
+        try:
+            self.user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+
+        self.paths = [reverse(name) for name in options['views']]
+        per_worker = max(options['requests'] // options['concurrency'], 1)
+
+        # The test clients send Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.report('wsgi', *self.run_threads(options['concurrency'], per_worker))
+            connection.close()
+            with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+                self.report('asgi', *asyncio.run(self.run_tasks(options['concurrency'], per_worker)))
+
+    def run_threads(self, workers, per_worker):
+        latencies, errors = [], []
+
+        def worker():
+            close_old_connections()
+            client = Client()
+            client.force_login(self.user)
+            try:
+                for i in range(per_worker):
+                    started = time.perf_counter()
+                    response = client.get(self.paths[i % len(self.paths)])
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+                client.logout()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors, time.perf_counter() - started
+
+    async def run_tasks(self, workers, per_worker):
+        latencies, errors = [], []
+
+        async def worker():
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            for i in range(per_worker):
+                started = time.perf_counter()
+                response = await client.get(self.paths[i % len(self.paths)])
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+            await client.alogout()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return latencies, errors, time.perf_counter() - started
+
+    def report(self, label, latencies, errors, elapsed):
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        style = self.style.ERROR if errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{label}: {len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} req/s); '
+            f'p50 {cuts[49] * 1000:.1f} ms, p99 {cuts[98] * 1000:.1f} ms; {len(errors)} non-200 response(s)'
+        ))
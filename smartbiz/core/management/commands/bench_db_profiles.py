@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Run stress_record_sale against each database profile in settings.DATABASE_PROFILES '
+        'and report sales per second. Each profile runs in its own process because the '
+        'profile is chosen when settings load; its database is migrated first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            default=['sqlite-baseline', 'sqlite'],
+            help='Profiles to compare (default: sqlite-baseline sqlite)',
+        )
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent sellers (default: 8)')
+        parser.add_argument('--sales', type=int, default=50, help='Sale attempts per thread (default: 50)')
+
+    def handle(self, *args, **options):
+        unknown = set(options['profiles']) - set(settings.DATABASE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}")
+
+        for profile in options['profiles']:
+            env = {
+                **os.environ,
+                'DB_PROFILE': profile,
+                'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            }
+            manage = [sys.executable, str(settings.BASE_DIR / 'manage.py')]
+            migrate = subprocess.run([*manage, 'migrate', '-v', '0'], env=env, capture_output=True, text=True)
+            if migrate.returncode:
+                self.stderr.write(self.style.ERROR(f'{profile}: migrate failed: {migrate.stderr.strip().splitlines()[-1]}'))
+                continue
+            stress = subprocess.run(
+                [
+                    *manage, 'stress_record_sale', '--mode', 'atomic',
+                    '--threads', str(options['threads']),
+                    '--sales', str(options['sales']),
+                    '--stock', str(options['threads'] * options['sales']),
+                ],
+                env=env, capture_output=True, text=True,
+            )
+            output = (stress.stdout or stress.stderr).strip()
+            self.stdout.write(f'{profile}: {output.removeprefix("atomic: ")}')
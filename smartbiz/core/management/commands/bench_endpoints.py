@@ -0,0 +1,157 @@
+import json
+import logging
+import math
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+from core.models import Product, Subscription, SubscriptionPlan
+
+# Routes that would end the session mid-run
+SKIPPED_ROUTES = {'logout'}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        'GET every named route in the root URLconf as a business owner and as a staff user, '
+        'and write latency percentiles and query counts per route to a JSON report. '
+        'Seed a database with `manage.py seed_data` first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='seed-0', help='Business owner to request as (default: seed-0)')
+        parser.add_argument('--admin', default='seed-admin', help='Staff user to request as (default: seed-admin)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per route (default: 20)')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per route first (default: 2)')
+        parser.add_argument('--output', default='bench-report.json', help='Report path (default: bench-report.json)')
+        parser.add_argument('--compare', help='Earlier report to print p50 and query count changes against')
+
+    def handle(self, *args, **options):
+        users = {'owner': options['user'], 'admin': options['admin']}
+        for role, username in users.items():
+            try:
+                users[role] = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No {role} user named {username!r}; run seed_data first')
+
+        routes = self.routes(users['owner'])
+        results = []
+        # 404s and 405s are expected (POST-only routes, owner objects seen by the admin)
+        # and are reported below instead of logged per request
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            # The test client sends Host: testserver
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for role, user in users.items():
+                    client = Client()
+                    client.force_login(user)
+                    for name, path in routes:
+                        results.append({'route': name, 'path': path, 'role': role, **self.measure(client, path, options)})
+                    client.logout()
+        finally:
+            request_logger.setLevel(level)
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+
+        for row in results:
+            self.stdout.write(
+                f"{row['role']:5} {row['route']:28} {row['status']} "
+                f"p50 {row['p50_ms']:7.1f} ms  p95 {row['p95_ms']:7.1f} ms  p99 {row['p99_ms']:7.1f} ms  "
+                f"{row['queries']:3} queries"
+            )
+        if options['compare']:
+            self.compare(options['compare'], results)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} result(s) to {options['output']}"))
+
+    def routes(self, owner):
+        """(name, path) for every named route, with URL arguments filled from the owner's data"""
+        arguments = {
+            'product_id': Product.objects.filter(user=owner).values_list('id', flat=True).first(),
+            'plan_id': SubscriptionPlan.objects.values_list('id', flat=True).first(),
+            'subscription_id': Subscription.objects.filter(user=owner).values_list('id', flat=True).first(),
+            'user_id': owner.id,
+        }
+        routes = []
+        for pattern in get_resolver().url_patterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name or pattern.name in SKIPPED_ROUTES:
+                continue
+            kwargs = {key: arguments.get(key) for key in pattern.pattern.converters}
+            if None in kwargs.values():
+                self.stderr.write(f'Skipping {pattern.name}: no data for {", ".join(kwargs)}')
+                continue
+            routes.append((pattern.name, reverse(pattern.name, kwargs=kwargs)))
+        return routes
+
+    def measure(self, client, path, options):
+        for _ in range(options['warmup']):
+            client.get(path)
+        # With DEBUG on the query log may already be at its 9000-entry cap
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+        # Read it now: the capture slices a log that every later request resets
+        query_count = len(queries)
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'status': response.status_code,
+            'queries': query_count,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+        }
+
+    def compare(self, path, results):
+        with open(path) as previous:
+            baseline = {(row['role'], row['route']): row for row in json.load(previous)['results']}
+        self.stdout.write(f'\nChanges against {path}:')
+        for row in results:
+            before = baseline.get((row['role'], row['route']))
+            if before is None:
+                continue
+            change = (row['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            style = self.style.ERROR if change > 20 or row['queries'] > before['queries'] else str
+            self.stdout.write(style(
+                f"{row['role']:5} {row['route']:28} p50 {before['p50_ms']:7.1f} -> {row['p50_ms']:7.1f} ms "
+                f"({change:+.0f}%)  queries {before['queries']} -> {row['queries']}"
+            ))
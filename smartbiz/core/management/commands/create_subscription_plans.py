@@ -12,6 +12,7 @@ class Command(BaseCommand):
                 'description': 'Perfect for getting started with basic inventory and sales tracking.',
                 'price': 0,
                 'duration_days': 30,
+                'max_products': 50,
                 'features': [
                     'Up to 50 products',
                     'Basic sales tracking',
@@ -24,6 +25,7 @@ class Command(BaseCommand):
                 'description': 'Ideal for small businesses managing daily sales and inventory.',
                 'price': 499,
                 'duration_days': 30,
+                'max_products': 500,
                 'features': [
                     'Up to 500 products',
                     'Advanced sales tracking',
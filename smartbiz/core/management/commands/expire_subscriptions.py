@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.subscriptions import expire_lapsed_subscriptions, send_renewal_reminders
+
+
+class Command(BaseCommand):
+    help = (
+        'Deactivate subscriptions whose end date has passed and email renewal reminders '
+        'to owners whose subscription ends within SUBSCRIPTION_REMINDER_DAYS. '
+        'Safe to run repeatedly; schedule it daily from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Reminders sent per batch (default: SUBSCRIPTION_REMINDER_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--skip-reminders',
+            action='store_true',
+            help='Only expire lapsed subscriptions',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        expired = expire_lapsed_subscriptions()
+        self.stdout.write(
+            f'Expired {expired} subscription(s) in {time.perf_counter() - started:.2f}s'
+        )
+
+        if not options['skip_reminders']:
+            started = time.perf_counter()
+            sent = send_renewal_reminders(chunk_size=options['chunk_size'])
+            self.stdout.write(
+                f'Sent {sent} renewal reminder(s) in {time.perf_counter() - started:.2f}s'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Subscription maintenance finished'))
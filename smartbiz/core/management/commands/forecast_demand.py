@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.forecasting import forecast_products, subscriber_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Forecast daily demand and suggest a reorder point and quantity for every product '
+        'of every current subscriber. Schedule it nightly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only forecast this user id\'s products')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Products per batch (default: FORECAST_BATCH_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        products = subscriber_products()
+        if options['user'] is not None:
+            products = products.filter(user_id=options['user'])
+
+        count = forecast_products(products, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Forecast {count} product(s) in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,48 @@
+import csv
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.imports import import_products
+
+
+class Command(BaseCommand):
+    help = 'Import products for a user from a CSV file (name,quantity,buying_price,selling_price)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='Path to the CSV file')
+        parser.add_argument('--user', required=True, help='Username that will own the products')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.PRODUCT_IMPORT_BATCH_SIZE,
+            help=f'Rows per INSERT (default: {settings.PRODUCT_IMPORT_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        started = time.perf_counter()
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as csv_file:
+                result = import_products(user, csv_file, batch_size=options['batch_size'])
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["csv_path"]}: {exc}')
+        except UnicodeDecodeError:
+            raise CommandError(f'{options["csv_path"]} must be UTF-8 encoded CSV')
+        except csv.Error as exc:
+            raise CommandError(f'{options["csv_path"]} is not valid CSV: {exc}')
+        elapsed = time.perf_counter() - started
+
+        for line, message in result.errors:
+            self.stdout.write(self.style.WARNING(f'Line {line}: {message}'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Imported {result.created} product(s) in {elapsed:.2f}s; '
+                f'{result.error_count} row(s) skipped'
+            )
+        )
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.analytics import daily_sales_from_sales
+from core.models import DailySales, Sale
+
+
+class Command(BaseCommand):
+    help = 'Backfill the DailySales rollup from Sale rows, or verify that it matches them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the rollup with the Sale table without changing anything',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Only process sales belonging to this user id',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per INSERT while backfilling (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        sales = Sale.objects.all()
+        rollups = DailySales.objects.all()
+        if options['user'] is not None:
+            sales = sales.filter(user_id=options['user'])
+            rollups = rollups.filter(user_id=options['user'])
+
+        if options['verify']:
+            self.verify(sales, rollups)
+        else:
+            self.backfill(sales, rollups, options['batch_size'])
+
+    def backfill(self, sales, rollups, batch_size):
+        created = 0
+        batch = []
+        with transaction.atomic():
+            rollups.delete()
+            for row in daily_sales_from_sales(sales).iterator(chunk_size=batch_size):
+                batch.append(DailySales(**row))
+                if len(batch) >= batch_size:
+                    DailySales.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                DailySales.objects.bulk_create(batch)
+                created += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {created} daily sales row(s)')
+        )
+
+    def verify(self, sales, rollups):
+        fields = ('units', 'revenue', 'transactions')
+        expected = {
+            (row['user_id'], row['product_id'], row['date']): tuple(row[f] for f in fields)
+            for row in daily_sales_from_sales(sales).iterator()
+        }
+        mismatches = 0
+        for row in rollups.values('user_id', 'product_id', 'date', *fields).iterator():
+            key = (row['user_id'], row['product_id'], row['date'])
+            actual = tuple(row[f] for f in fields)
+            if expected.pop(key, None) != actual:
+                mismatches += 1
+                self.stdout.write(
+                    self.style.WARNING(f'Rollup mismatch for user {key[0]}, product {key[1]} on {key[2]}')
+                )
+        for key in expected:
+            mismatches += 1
+            self.stdout.write(
+                self.style.WARNING(f'Missing rollup for user {key[0]}, product {key[1]} on {key[2]}')
+            )
+
+        if mismatches:
+            raise CommandError(
+                f'{mismatches} rollup row(s) do not match sales; run rebuild_sales_rollup to repair'
+            )
+        self.stdout.write(self.style.SUCCESS('Sales rollup matches the Sale table'))
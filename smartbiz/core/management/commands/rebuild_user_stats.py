@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.models import StockAlert, UserStats
+from core.stats import count_stock_alerts, count_user_stats, rebuild_user_stats
+
+STAT_FIELDS = ('product_count', 'low_stock_count', 'out_of_stock_count', 'sale_count')
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount every user\'s product, stock level and sale counts from the Product and '
+        'Sale tables, repairing their stock alerts, or verify that the stored counts and '
+        'alerts match them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the stored counts with the tables without changing anything',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Only process this user id',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Users counted per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user'] is not None:
+            users = users.filter(pk=options['user'])
+
+        if options['verify']:
+            self.verify(users, options['batch_size'])
+        else:
+            written = rebuild_user_stats(users, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {written} user(s)'))
+
+    def verify(self, users, batch_size):
+        mismatches = 0
+        user_ids = list(users.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            stored = {
+                row[0]: row[1:]
+                for row in UserStats.objects.filter(user_id__in=batch).values_list('user_id', *STAT_FIELDS)
+            }
+            alerts = count_stock_alerts(batch)
+            for expected in count_user_stats(batch):
+                actual = stored.get(expected.user_id, (0,) * len(STAT_FIELDS))
+                if actual != tuple(getattr(expected, field) for field in STAT_FIELDS):
+                    mismatches += 1
+                    self.stdout.write(
+                        self.style.WARNING(f'Stats mismatch for user {expected.user_id}')
+                    )
+                elif alerts[expected.user_id] != self.expected_alerts(expected):
+                    mismatches += 1
+                    self.stdout.write(
+                        self.style.WARNING(f'Stock alerts out of sync for user {expected.user_id}')
+                    )
+
+        if mismatches:
+            raise CommandError(
+                f'{mismatches} user(s) have stale stats; run rebuild_user_stats to repair'
+            )
+        self.stdout.write(self.style.SUCCESS('User stats match the Product and Sale tables'))
+
+    @staticmethod
+    def expected_alerts(stats):
+        counts = {StockAlert.LOW: stats.low_stock_count, StockAlert.OUT: stats.out_of_stock_count}
+        return {level: count for level, count in counts.items() if count}
@@ -0,0 +1,29 @@
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from core.analytics import refresh_platform_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the admin dashboard metrics snapshot. Needs a cache shared with the '
+        'web workers (REDIS_URL)'
+    )
+
+    def handle(self, *args, **options):
+        if isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)):
+            # The snapshot would only land in this process's memory
+            raise CommandError(
+                'The configured cache is private to this process, so the web workers would '
+                'never see the refreshed metrics. Set REDIS_URL to share the cache.'
+            )
+
+        metrics = refresh_platform_metrics()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed platform metrics: {metrics['total_users']} users, "
+                f"{metrics['active_subscriptions']} active subscriptions, "
+                f"KES {metrics['total_revenue']} revenue"
+            )
+        )
@@ -0,0 +1,154 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from core.alerts import sync_stock_alerts
+from core.analytics import daily_sales_from_sales
+from core.models import DailySales, Product, Sale, Subscription, SubscriptionPlan
+from core.stats import rebuild_user_stats
+
+PRODUCT_NAMES = (
+    'Sugar', 'Rice', 'Maize Flour', 'Wheat Flour', 'Cooking Oil', 'Milk', 'Bread', 'Eggs',
+    'Tea Leaves', 'Coffee', 'Salt', 'Soap', 'Detergent', 'Toothpaste', 'Matches', 'Candles',
+    'Soda', 'Water', 'Juice', 'Biscuits', 'Sweets', 'Batteries', 'Airtime', 'Paraffin',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate subscribed business owners with products and a sales history, plus one '
+        'staff user, using bulk inserts. Users are named <prefix><n> and <prefix>admin.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Business owners (default: 10)')
+        parser.add_argument('--products', type=int, default=50, help='Products per owner (default: 50)')
+        parser.add_argument('--sales', type=int, default=20, help='Sales per product (default: 20)')
+        parser.add_argument('--days', type=int, default=90, help='Days of sales history (default: 90)')
+        parser.add_argument('--prefix', default='seed-', help='Username prefix (default: seed-)')
+        parser.add_argument('--password', default='seed12345', help='Password for every seeded user')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT (default: 5000)')
+        parser.add_argument('--clear', action='store_true', help='Delete users with this prefix first')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        if options['clear']:
+            self.clear(prefix)
+
+        if not SubscriptionPlan.objects.exists():
+            call_command('create_subscription_plans', stdout=self.stdout)
+        plans = list(SubscriptionPlan.objects.all())
+
+        with transaction.atomic():
+            owners = self.create_users(prefix, options)
+            self.create_subscriptions(owners, plans)
+            products = self.create_products(owners, options['products'])
+            sale_count = self.create_sales(products, options['sales'], options['days'])
+            self.rebuild_rollup(owners)
+            rebuild_user_stats(User.objects.filter(pk__in=[owner.pk for owner in owners]))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(owners)} owner(s), {len(products)} product(s) and {sale_count} sale(s) '
+            f'in {time.perf_counter() - started:.1f}s; log in as {prefix}0 or {prefix}admin '
+            f'with password {options["password"]!r}'
+        ))
+
+    def clear(self, prefix):
+        users = User.objects.filter(username__startswith=prefix)
+        deleted = 0
+        with transaction.atomic():
+            # Sales and products are PROTECTed, so remove them before their owners
+            for model in (DailySales, Sale, Product, User):
+                deleted += model.objects.filter(
+                    **({'username__startswith': prefix} if model is User else {'user__in': users})
+                ).delete()[0]
+        self.stdout.write(f'Deleted {deleted} row(s) from a previous seed')
+
+    def create_users(self, prefix, options):
+        # Hashing is deliberately slow, so every seeded user shares one hash
+        password = make_password(options['password'])
+        User.objects.bulk_create(
+            [User(username=f'{prefix}{i}', password=password) for i in range(options['users'])]
+            + [User(username=f'{prefix}admin', password=password, is_staff=True)],
+            batch_size=self.batch_size,
+        )
+        return list(
+            User.objects.filter(username__startswith=prefix, is_staff=False).order_by('id')
+        )
+
+    def create_subscriptions(self, owners, plans):
+        today = timezone.now().date()
+        Subscription.objects.bulk_create(
+            [
+                Subscription(
+                    user=owner,
+                    plan=self.random.choice(plans),
+                    start_date=today - timedelta(days=10),
+                    end_date=today + timedelta(days=self.random.randint(1, 60)),
+                )
+                for owner in owners
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def create_products(self, owners, per_owner):
+        products = []
+        for owner in owners:
+            for i in range(per_owner):
+                buying_price = Decimal(self.random.randint(20, 2000))
+                # Roughly 10% out of stock and 20% low, like a real shop
+                roll = self.random.random()
+                quantity = 0 if roll < 0.1 else self.random.randint(1, 9) if roll < 0.3 else self.random.randint(10, 500)
+                name = f'{PRODUCT_NAMES[i % len(PRODUCT_NAMES)]} {i // len(PRODUCT_NAMES) + 1}'
+                products.append(Product(
+                    user=owner,
+                    name=name,
+                    name_lower=name.lower(),
+                    quantity=quantity,
+                    buying_price=buying_price,
+                    selling_price=(buying_price * Decimal(self.random.uniform(1.1, 1.6))).quantize(Decimal('1')),
+                ))
+        # created_at is auto_now_add, so every product is stamped now
+        products = Product.objects.bulk_create(products, batch_size=self.batch_size)
+        sync_stock_alerts(products, new=True)
+        return products
+
+    def create_sales(self, products, per_product, days):
+        now = timezone.now()
+        seconds = days * 24 * 60 * 60
+        batch, created = [], 0
+        for product in products:
+            for _ in range(per_product):
+                quantity_sold = self.random.randint(1, 5)
+                batch.append(Sale(
+                    user_id=product.user_id,
+                    product=product,
+                    quantity_sold=quantity_sold,
+                    total_price=quantity_sold * product.selling_price,
+                    created_at=now - timedelta(seconds=self.random.randrange(seconds)),
+                ))
+                if len(batch) >= self.batch_size:
+                    Sale.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+        Sale.objects.bulk_create(batch)
+        return created + len(batch)
+
+    def rebuild_rollup(self, owners):
+        rows = daily_sales_from_sales(Sale.objects.filter(user__in=owners))
+        DailySales.objects.bulk_create(
+            (DailySales(**row) for row in rows.iterator(chunk_size=self.batch_size)),
+            batch_size=self.batch_size,
+        )
@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, transaction
+from core.analytics import add_sale_to_rollup
+from core.inventory import InsufficientStock, sell_product
+from core.models import DailySales, Product, Sale
+
+
+def legacy_sell(product_id, quantity_sold):
+    """The pre-atomic record_sale path: check in Python, then save() the whole row"""
+    product = Product.objects.get(pk=product_id)
+    if quantity_sold > product.quantity:
+        raise InsufficientStock(f"Not enough {product.name} in stock")
+    with transaction.atomic():
+        sale = Sale.objects.create(
+            user_id=product.user_id,
+            product=product,
+            quantity_sold=quantity_sold,
+            total_price=quantity_sold * product.selling_price,
+        )
+        add_sale_to_rollup(sale)
+        product.quantity -= quantity_sold
+        product.save()
+
+
+def atomic_sell(product_id, quantity_sold):
+    """The current record_sale path"""
+    product = Product.objects.get(pk=product_id)
+    sell_product(product, quantity_sold)
+
+
+class Command(BaseCommand):
+    help = (
+        'Sell one product from many threads at once and report oversold or lost '
+        'stock updates and throughput for the legacy and atomic record_sale paths. '
+        'Creates and removes a scratch user in the configured database.'
+    )
+
+    modes = {
+        'legacy': legacy_sell,
+        'atomic': atomic_sell,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent sellers (default: 8)')
+        parser.add_argument('--sales', type=int, default=50, help='Sale attempts per thread (default: 50)')
+        parser.add_argument('--stock', type=int, default=300, help='Starting stock (default: 300)')
+        parser.add_argument(
+            '--mode',
+            choices=['both', *self.modes],
+            default='both',
+            help='Which implementation to exercise (default: both)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.stderr.write('An in-memory SQLite database cannot be shared between threads; use a file or server database.')
+            return
+
+        modes = list(self.modes) if options['mode'] == 'both' else [options['mode']]
+        user = User.objects.create_user(username=f'stress-{uuid.uuid4().hex[:12]}')
+        try:
+            for mode in modes:
+                self.run_mode(mode, user, options)
+        finally:
+            DailySales.objects.filter(user=user).delete()
+            Sale.objects.filter(user=user).delete()
+            Product.objects.filter(user=user).delete()
+            user.delete()
+
+    def run_mode(self, mode, user, options):
+        sell = self.modes[mode]
+        product = Product.objects.create(
+            user=user,
+            name=f'Stress item ({mode})',
+            quantity=options['stock'],
+            buying_price=1,
+            selling_price=2,
+        )
+        counts = {'sold': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker():
+            close_old_connections()
+            try:
+                for _ in range(options['sales']):
+                    try:
+                        sell(product.pk, 1)
+                        outcome = 'sold'
+                    except InsufficientStock:
+                        outcome = 'rejected'
+                    except Exception:
+                        outcome = 'errors'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        units_sold = Sale.objects.filter(product=product).count()
+        lost_updates = product.quantity - (options['stock'] - units_sold)
+        oversold = max(units_sold - options['stock'], 0)
+
+        style = self.style.SUCCESS if lost_updates == 0 and oversold == 0 else self.style.ERROR
+        self.stdout.write(style(
+            f"{mode}: {counts['sold']} sold, {counts['rejected']} rejected, {counts['errors']} error(s) "
+            f"in {elapsed:.2f}s ({counts['sold'] / elapsed:.1f} sales/s); "
+            f"stock {product.quantity}, lost updates {lost_updates}, oversold {oversold}"
+        ))
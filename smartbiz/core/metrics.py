@@ -0,0 +1,188 @@
+"""Per-view request metrics kept in process and exposed in Prometheus text format.
+
+RequestMetricsMiddleware times each request and files it under the resolved
+URL name. Database time and query count come from an execute wrapper on
+every connection, and template time from InstrumentedDjangoTemplates; both
+report to the request that is current in their context, so they work for
+sync and async views alike.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# name -> (help text, buckets, RequestStats attribute)
+REQUEST_METRICS = {
+    "smartbiz_request_duration_seconds": ("Wall time per request", SECONDS_BUCKETS, "wall_time"),
+    "smartbiz_request_db_seconds": ("Time spent in database queries per request", SECONDS_BUCKETS, "db_time"),
+    "smartbiz_request_queries": ("Database queries per request", QUERY_BUCKETS, "queries"),
+    "smartbiz_request_template_seconds": ("Template rendering time per request", SECONDS_BUCKETS, "template_time"),
+}
+
+_current_request = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("wall_time", "db_time", "queries", "template_time")
+
+    def __init__(self):
+        self.wall_time = self.db_time = self.template_time = 0.0
+        self.queries = 0
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts are per bucket and made cumulative on export"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, view, stats):
+        with self._lock:
+            for name, (_, buckets, attribute) in REQUEST_METRICS.items():
+                key = (name, view)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(buckets)
+                histogram.observe(getattr(stats, attribute))
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format"""
+        with self._lock:
+            snapshot = {
+                key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()
+            }
+        lines = []
+        for name, (help_text, buckets, _) in REQUEST_METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, view), (counts, total, count) in sorted(snapshot.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {total}')
+                lines.append(f'{name}_count{{view="{view}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper: charge the query to the current request"""
+    stats = _current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver; the wrapper list outlives reconnects, so add it once"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current_request.get()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time charged to the current request"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+            self.finish(request, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+            self.finish(request, stats, started)
+
+    def finish(self, request, stats, started):
+        stats.wall_time = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else "unresolved"
+        registry.observe(view, stats)
+
+        if stats.wall_time * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            logger.warning(
+                "Slow request: %s %s (%s) took %.0f ms with %d queries (%.0f ms in the database, %.0f ms rendering)",
+                request.method, request.get_full_path(), view, stats.wall_time * 1000,
+                stats.queries, stats.db_time * 1000, stats.template_time * 1000,
+            )
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def roll_up_existing_sales(apps, schema_editor):
+    Sale = apps.get_model('core', 'Sale')
+    DailySales = apps.get_model('core', 'DailySales')
+    # Same grouping as analytics.daily_sales_from_sales
+    rows = (
+        Sale.objects.annotate(date=TruncDate('created_at'))
+        .values('user_id', 'product_id', 'date')
+        .annotate(units=Sum('quantity_sold'), revenue=Sum('total_price'), transactions=Count('id'))
+        .order_by()
+    )
+    DailySales.objects.bulk_create(
+        (DailySales(**row) for row in rows.iterator(chunk_size=1000)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+                'indexes': [models.Index(fields=['user', 'date'], name='dailysales_user_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'product', 'date'), name='unique_daily_sales_per_product')],
+            },
+        ),
+        migrations.RunPython(roll_up_existing_sales, migrations.RunPython.noop),
+    ]
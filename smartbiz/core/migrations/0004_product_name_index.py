@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('user'), django.db.models.functions.text.Lower('name'), models.F('id'), name='product_user_name_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_product_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='reminder_sent_for',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
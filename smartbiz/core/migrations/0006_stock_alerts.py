@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 13:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def open_alerts_for_current_stock(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    StockAlert = apps.get_model('core', 'StockAlert')
+    for level, condition in (('out', Q(quantity=0)), ('low', Q(quantity__gt=0, quantity__lt=F('reorder_level')))):
+        StockAlert.objects.bulk_create(
+            (
+                StockAlert(user_id=user_id, product_id=product_id, level=level)
+                for user_id, product_id in Product.objects.filter(condition).values_list('user_id', 'id').iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_subscription_reminder_sent_for'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reorder_level',
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('low', 'Low stock'), ('out', 'Out of stock')], max_length=3)),
+                ('raised_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alert', to='core.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'level'], name='stockalert_user_level_idx')],
+            },
+        ),
+        migrations.RunPython(open_alerts_for_current_stock, migrations.RunPython.noop),
+    ]
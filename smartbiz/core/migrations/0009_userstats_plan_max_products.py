@@ -0,0 +1,66 @@
+# Generated by Django 6.0 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def set_plan_limits(apps, schema_editor):
+    SubscriptionPlan = apps.get_model('core', 'SubscriptionPlan')
+    # The limits create_subscription_plans advertises
+    for name, max_products in (('Free', 50), ('Basic', 500)):
+        SubscriptionPlan.objects.filter(name=name).update(max_products=max_products)
+
+
+def count_existing_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Product = apps.get_model('core', 'Product')
+    Sale = apps.get_model('core', 'Sale')
+    UserStats = apps.get_model('core', 'UserStats')
+
+    stats = {user_id: UserStats(user_id=user_id) for user_id in User.objects.values_list('id', flat=True)}
+    product_counts = Product.objects.values('user_id').annotate(
+        product_count=Count('id'),
+        out_of_stock_count=Count('id', filter=Q(quantity=0)),
+        low_stock_count=Count('id', filter=Q(quantity__gt=0, quantity__lt=F('reorder_level'))),
+    ).order_by()
+    for row in product_counts:
+        user_id = row.pop('user_id')
+        for field, count in row.items():
+            setattr(stats[user_id], field, count)
+    for user_id, count in Sale.objects.values_list('user_id').annotate(Count('id')).order_by():
+        stats[user_id].sale_count = count
+    UserStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sale_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='max_products',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_count', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('out_of_stock_count', models.IntegerField(default=0)),
+                ('sale_count', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'user stats',
+            },
+        ),
+        migrations.RunPython(set_plan_limits, migrations.RunPython.noop),
+        migrations.RunPython(count_existing_stats, migrations.RunPython.noop),
+    ]
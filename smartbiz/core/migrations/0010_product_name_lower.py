@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+def fold_existing_names(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    last_pk = 0
+    while True:
+        batch = list(Product.objects.filter(pk__gt=last_pk).order_by('pk').only('name')[:1000])
+        if not batch:
+            return
+        for product in batch:
+            product.name_lower = product.name.lower()
+        Product.objects.bulk_update(batch, ['name_lower'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_userstats_plan_max_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='name_lower',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fold_existing_names, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_user_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['user', 'name_lower', 'id'], name='product_user_name_idx'),
+        ),
+    ]
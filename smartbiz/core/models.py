@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -8,6 +9,8 @@ class SubscriptionPlan(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     duration_days = models.PositiveIntegerField(default=30)
+    # Most products a subscriber may have; blank means unlimited
+    max_products = models.PositiveIntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -23,6 +26,14 @@ class Subscription(models.Model):
     start_date = models.DateField(default=timezone.now)
     end_date = models.DateField()
     is_active = models.BooleanField(default=True)
+    # end_date the last renewal reminder was sent for (see expire_subscriptions)
+    reminder_sent_for = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Admin "due soon" / expired filters and the end_date ordering
+            models.Index(fields=["end_date", "is_active"], name="subscription_end_active_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.name}"
@@ -32,25 +43,160 @@ class Subscription(models.Model):
         return self.is_active and self.start_date <= today <= self.end_date
 
 
+DEFAULT_REORDER_LEVEL = 10
+
+
 class Product(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
+    # name.lower(), for case-insensitive search and alphabetical paging. Stored
+    # rather than computed with LOWER(), which only folds ASCII on SQLite.
+    # save() keeps it in step; bulk writes set it themselves.
+    name_lower = models.TextField(editable=False, default="")
     quantity = models.PositiveIntegerField(default=0)
+    # Stock below this is "low" and raises a StockAlert
+    reorder_level = models.PositiveIntegerField(default=DEFAULT_REORDER_LEVEL)
     buying_price = models.DecimalField(max_digits=10, decimal_places=2)
     selling_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Stock buckets on the dashboard and in notifications
+            models.Index(fields=["user", "quantity"], name="product_user_quantity_idx"),
+            # Case-insensitive name prefix search and alphabetical paging
+            models.Index(fields=["user", "name_lower", "id"], name="product_user_name_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        self.name_lower = self.name.lower()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "name_lower"}
+        super().save(*args, **kwargs)
+
 
 class Sale(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity_sold = models.PositiveIntegerField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # When the sale happened; offline sync sets it to the device's timestamp
+    created_at = models.DateTimeField(default=timezone.now)
+    # Client-generated key for sales uploaded by /api/sales/sync/, so retries are no-ops
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "idempotency_key"],
+                condition=Q(idempotency_key__isnull=False),
+                name="unique_sale_idempotency_key",
+            ),
+        ]
+        indexes = [
+            # Sales history pages and today's sales, newest first
+            models.Index(fields=["user", "created_at", "id"], name="sale_user_created_idx"),
+            # Sales history filtered to one product
+            models.Index(fields=["product", "created_at", "id"], name="sale_product_created_idx"),
+        ]
 
     def __str__(self):
         return f"Sale of {self.product.name} by {self.user.username}"
 
+
+
+class DailySales(models.Model):
+    """Per-day sales rollup for one product, maintained alongside each Sale"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    date = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    transactions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "daily sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product", "date"],
+                name="unique_daily_sales_per_product",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "date"], name="dailysales_user_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} on {self.date}"
+
+
+class StockAlert(models.Model):
+    """An open low- or out-of-stock alert; the row is deleted when stock recovers"""
+    LOW = "low"
+    OUT = "out"
+    LEVEL_CHOICES = [(LOW, "Low stock"), (OUT, "Out of stock")]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="stock_alert")
+    level = models.CharField(max_length=3, choices=LEVEL_CHOICES)
+    raised_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # A user's open alerts by level, counted by rebuild_user_stats --verify
+            models.Index(fields=["user", "level"], name="stockalert_user_level_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_level_display()}: {self.product.name}"
+
+
+class StockForecast(models.Model):
+    """Nightly demand forecast and reorder suggestion for one product (see forecast_demand)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="forecast")
+    # Units per day: plain average over the history window, and the smoothed recent rate
+    velocity = models.FloatField()
+    forecast_daily = models.FloatField()
+    # Reorder when stock falls to reorder_point; order reorder_quantity units
+    reorder_point = models.PositiveIntegerField()
+    reorder_quantity = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Dashboard reorder suggestions
+            models.Index(fields=["user", "reorder_point"], name="forecast_user_reorder_idx"),
+        ]
+
+    def __str__(self):
+        return f"Forecast for {self.product.name}"
+
+    def days_of_stock(self, quantity):
+        """Days until `quantity` runs out at the forecast rate, or None without demand"""
+        if self.forecast_daily <= 0:
+            return None
+        return int(quantity / self.forecast_daily)
+
+
+class UserStats(models.Model):
+    """Running per-user counts, adjusted in the same transaction as each product or sale write.
+
+    The stock counts match the user's open StockAlert rows. See core.stats,
+    and the rebuild_user_stats command to recompute them.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="stats")
+    product_count = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    out_of_stock_count = models.IntegerField(default=0)
+    sale_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "user stats"
+
+    def __str__(self):
+        return f"Stats for {self.user}"
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe token for the ordering values of the last row on a page"""
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; returns None for a missing or malformed token"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        return None
+    return values
+
+
+def _after(ordering, values):
+    """Q matching rows strictly after `values` in `ordering` (a row-value comparison)"""
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        field = ordering[i].lstrip("-")
+        lookup = "lt" if ordering[i].startswith("-") else "gt"
+        step = Q(**{f"{field}__{lookup}": values[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{field: values[i]}) & condition
+        condition = step
+    return condition
+
+
+def _keyset_queryset(queryset, ordering, cursor):
+    values = decode_cursor(cursor)
+    queryset = queryset.order_by(*ordering)
+    if values is not None and len(values) == len(ordering):
+        try:
+            queryset = queryset.filter(_after(ordering, values))
+        except (ValidationError, ValueError):
+            # Tampered or stale cursor: start again from the first page
+            pass
+    return queryset
+
+
+def _keyset_result(rows, ordering, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            [getattr(last, field.lstrip("-")) for field in ordering]
+        )
+    return rows, next_cursor
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=50):
+    """Fetch one page of `queryset` ordered by `ordering`, starting after `cursor`.
+
+    `ordering` must end in a unique field (normally the primary key) so that
+    every row has a distinct position. Each page is a single indexed range
+    query, so the cost of page N does not grow with N the way OFFSET does.
+    Returns the rows and the cursor for the next page (None on the last page).
+    """
+    queryset = _keyset_queryset(queryset, ordering, cursor)
+    return _keyset_result(list(queryset[:page_size + 1]), ordering, page_size)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, page_size=50):
+    queryset = _keyset_queryset(queryset, ordering, cursor)
+    rows = [row async for row in queryset[:page_size + 1]]
+    return _keyset_result(rows, ordering, page_size)
@@ -0,0 +1,208 @@
+"""Profit, margin, growth and ABC reports computed with NumPy over the DailySales rollup.
+
+A report loads the user's rollup rows for the date range in one query and
+their product costs in another, as columns, then does every sum, ratio and
+ranking as an array operation. Money stays in integer cents until the
+result is built, so totals are exact. Cost of goods uses each product's
+current buying_price, as sales do not record what a unit cost at the time.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BigIntegerField, CharField, F
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from .models import DailySales, Product
+from .routers import replica_may_lag
+from .utils import get_data_version
+
+PERIODS = ("day", "week", "month")
+# Products making up the first 80% of revenue are class A, the next 15% B, the rest C
+ABC_THRESHOLDS = (0.8, 0.95)
+
+
+def _cents(field):
+    return Cast(Round(F(field) * 100), BigIntegerField())
+
+
+def _money(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _percent(numerator, denominator):
+    """Element-wise 100 * numerator / denominator, NaN where the denominator is 0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, 100 * numerator / np.where(denominator != 0, denominator, 1), np.nan)
+
+
+def _optional(value):
+    return None if np.isnan(value) else round(float(value), 1)
+
+
+def load_sales_columns(user, start, end):
+    """(product_id, date, units, revenue_cents) arrays for the user's rollup rows in the range"""
+    rows = list(
+        DailySales.objects.filter(user=user, date__gte=start, date__lte=end)
+        # ISO date strings skip the per-row date objects; NumPy parses them in bulk
+        .values_list("product_id", Cast("date", CharField()), "units", _cents("revenue"))
+    )
+    if not rows:
+        return (
+            np.empty(0, np.int64), np.empty(0, "datetime64[D]"),
+            np.empty(0, np.int64), np.empty(0, np.int64),
+        )
+    product_ids, dates, units, revenue = zip(*rows)
+    return (
+        np.array(product_ids, np.int64),
+        np.array(dates, "datetime64[D]"),
+        np.array(units, np.int64),
+        np.array(revenue, np.int64),
+    )
+
+
+def load_product_columns(user):
+    """(ids, names, unit_cost_cents) for the user's products, ordered by id"""
+    rows = list(
+        Product.objects.filter(user=user).order_by("id").values_list("id", "name", _cents("buying_price"))
+    )
+    ids, names, costs = zip(*rows) if rows else ((), (), ())
+    return np.array(ids, np.int64), list(names), np.array(costs, np.int64)
+
+
+def period_starts(dates, period):
+    """The first day of the day, ISO week or month each date falls in"""
+    if period == "month":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    if period == "week":
+        # 1970-01-01 was a Thursday, so Monday-based weeks start 3 days earlier
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype("datetime64[D]")
+    return dates
+
+
+def period_range(start, end, period):
+    """Every period start from the one containing `start` to the one containing `end`"""
+    first, last = period_starts(np.array([start, end], "datetime64[D]"), period)
+    if period == "month":
+        return np.arange(first.astype("datetime64[M]"), last.astype("datetime64[M]") + 1).astype("datetime64[D]")
+    return np.arange(first, last + 1, 7 if period == "week" else 1)
+
+
+def abc_classes(revenue):
+    """'A', 'B' or 'C' per product by its place in the cumulative revenue share"""
+    classes = np.full(len(revenue), "C")
+    total = revenue.sum()
+    if not total:
+        return classes
+    order = np.argsort(-revenue, kind="stable")
+    # Share of revenue earned by better-selling products; the product that
+    # crosses a threshold still belongs to the class below it
+    share_before = (np.cumsum(revenue[order]) - revenue[order]) / total
+    ranked = np.where(share_before < ABC_THRESHOLDS[0], "A", np.where(share_before < ABC_THRESHOLDS[1], "B", "C"))
+    classes[order] = np.where(revenue[order] > 0, ranked, "C")
+    return classes
+
+
+def compute_profit_report(user, start, end, period="month"):
+    """Totals, per-period and per-product revenue, cost, profit and margin for the range"""
+    sale_products, dates, units, revenue = load_sales_columns(user, start, end)
+    product_ids, names, unit_costs = load_product_columns(user)
+
+    product_index = np.searchsorted(product_ids, sale_products)
+    cost = units * unit_costs[product_index]
+    profit = revenue - cost
+
+    # Per product
+    n = len(product_ids)
+    product_units = np.bincount(product_index, weights=units, minlength=n)
+    product_revenue = np.bincount(product_index, weights=revenue, minlength=n)
+    product_cost = np.bincount(product_index, weights=cost, minlength=n)
+    product_profit = product_revenue - product_cost
+    product_margin = _percent(product_profit, product_revenue)
+    classes = abc_classes(product_revenue)
+    total_revenue = product_revenue.sum()
+    revenue_share = _percent(product_revenue, np.full(n, total_revenue))
+
+    # Per period, including periods without sales
+    starts = period_range(start, end, period)
+    period_index = np.searchsorted(starts, period_starts(dates, period))
+    periods = len(starts)
+    period_revenue = np.bincount(period_index, weights=revenue, minlength=periods)
+    period_cost = np.bincount(period_index, weights=cost, minlength=periods)
+    period_profit = period_revenue - period_cost
+    period_margin = _percent(period_profit, period_revenue)
+    revenue_growth = np.full(periods, np.nan)
+    profit_growth = np.full(periods, np.nan)
+    if periods > 1:
+        revenue_growth[1:] = _percent(np.diff(period_revenue), period_revenue[:-1])
+        profit_growth[1:] = _percent(np.diff(period_profit), np.abs(period_profit[:-1]))
+
+    order = np.argsort(-product_revenue, kind="stable")
+    sold = order[product_units[order] > 0]
+    return {
+        "start": start,
+        "end": end,
+        "period": period,
+        "totals": {
+            "units": int(units.sum()),
+            "revenue": _money(revenue.sum()),
+            "cost": _money(cost.sum()),
+            "profit": _money(profit.sum()),
+            "margin_percent": _optional(_percent(profit.sum(), revenue.sum())),
+        },
+        "periods": [
+            {
+                "start": starts[i].item(),
+                "revenue": _money(period_revenue[i]),
+                "cost": _money(period_cost[i]),
+                "profit": _money(period_profit[i]),
+                "margin_percent": _optional(period_margin[i]),
+                "revenue_growth": _optional(revenue_growth[i]),
+                "profit_growth": _optional(profit_growth[i]),
+            }
+            for i in range(periods)
+        ],
+        "products": [
+            {
+                "id": int(product_ids[i]),
+                "name": names[i],
+                "units": int(product_units[i]),
+                "revenue": _money(product_revenue[i]),
+                "cost": _money(product_cost[i]),
+                "profit": _money(product_profit[i]),
+                "margin_percent": _optional(product_margin[i]),
+                "revenue_share": _optional(revenue_share[i]),
+                "abc_class": str(classes[i]),
+            }
+            for i in sold
+        ],
+        "abc_summary": {
+            label: {
+                "count": int((classes[sold] == label).sum()),
+                "revenue": _money(product_revenue[sold][classes[sold] == label].sum()),
+            }
+            for label in "ABC"
+        },
+    }
+
+
+def profit_report_cache_key(user_id, version, start, end, period):
+    return f"profit-report:{user_id}:{version}:{period}:{start}:{end}"
+
+
+def get_profit_report(user, start=None, end=None, period="month"):
+    """The profit report for the range (default: the last year), cached until the user's next sale"""
+    end = end or timezone.now().date()
+    start = start or end - timedelta(days=364)
+    version = get_data_version(user.pk)
+    key = profit_report_cache_key(user.pk, version, start, end, period)
+    report = cache.get(key)
+    if report is None:
+        report = compute_profit_report(user, start, end, period)
+        if not replica_may_lag(version):
+            cache.set(key, report, settings.REPORT_CACHE_TIMEOUT)
+    return report
@@ -0,0 +1,105 @@
+"""Send read-only analytics queries to a replica database.
+
+Views opt in with @replica_reads; everything else, and every write, uses
+the primary. A browser that has just written (any POST, PUT, PATCH or
+DELETE) gets a short-lived cookie that keeps its reads on the primary, so
+a sale shows up on the next page even if the replica is behind.
+
+API clients authenticate with HTTP Basic and usually keep no cookies, so
+the pin cannot reach them. The /api/ views therefore never use
+@replica_reads: an API client always reads its own writes.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+PRIMARY_PIN_COOKIE = "primary_pin"
+# Sessions and other framework tables always use the primary
+REPLICA_APP_LABELS = {"auth", "core"}
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def replica_alias():
+    """The replica's database alias, or None if no replica is configured"""
+    return settings.REPLICA_DATABASE
+
+
+def reading_from_replica():
+    """True inside a @replica_reads view that is actually using the replica"""
+    return _replica_reads.get()
+
+
+def replica_may_lag(version):
+    """True when this read used the replica and may predate the write that made `version`.
+
+    `version` is a data version timestamp (utils.get_data_version); results
+    read under these conditions should be served but not cached.
+    """
+    return reading_from_replica() and time.time() - version < settings.REPLICA_PIN_SECONDS
+
+
+def _use_replica(request):
+    return replica_alias() is not None and PRIMARY_PIN_COOKIE not in request.COOKIES
+
+
+def replica_reads(view_func):
+    """Route the view's reads to the replica unless the client is pinned to the primary"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            token = _replica_reads.set(_use_replica(request))
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+
+        return _wrapped_view
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        token = _replica_reads.set(_use_replica(request))
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    return _wrapped_view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and model._meta.app_label in REPLICA_APP_LABELS:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema from the primary
+        return db != settings.REPLICA_DATABASE
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """After a write, keep this client's reads on the primary for REPLICA_PIN_SECONDS"""
+
+    def process_response(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE") and replica_alias():
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
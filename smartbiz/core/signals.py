@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .alerts import stock_level, sync_stock_alerts
+from .metrics import install_query_recorder
+from .models import Product, Sale, Subscription, SubscriptionPlan
+from .stats import adjust_user_stats
+from .utils import bump_data_version, bump_plans_version, invalidate_entitlement, invalidate_notifications
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Sale)
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_user_notifications(sender, instance, **kwargs):
+    """Stock or subscription changed: the owner's cached notifications are stale"""
+    invalidate_notifications(instance.user_id)
+    # A render that raced the open transaction may have cached pre-commit data
+    transaction.on_commit(lambda: invalidate_notifications(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_user_entitlement(sender, instance, **kwargs):
+    """Renewals and admin toggles must take effect on the user's next request"""
+    invalidate_entitlement(instance.user_id)
+    transaction.on_commit(lambda: invalidate_entitlement(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Sale)
+def bump_user_data_version(sender, instance, **kwargs):
+    """Products or sales changed: ETags derived from the data version must change too"""
+    bump_data_version(instance.user_id)
+    transaction.on_commit(lambda: bump_data_version(instance.user_id))
+
+
+@receiver(post_save, sender=Product)
+def sync_product_stock_alert(sender, instance, created, **kwargs):
+    """Raise or clear the product's stock alert if the save crossed its reorder level"""
+    sync_stock_alerts([instance], new=created)
+
+
+@receiver(post_save, sender=Product)
+def count_created_product(sender, instance, created, **kwargs):
+    if created:
+        adjust_user_stats(instance.user_id, products=1)
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    """The product's stock alert goes with it, so its level stops counting too"""
+    level = stock_level(instance.quantity, instance.reorder_level)
+    adjust_user_stats(instance.user_id, products=-1, levels={level: -1}, create=False)
+
+
+@receiver(post_save, sender=Sale)
+def count_created_sale(sender, instance, created, **kwargs):
+    if created:
+        adjust_user_stats(instance.user_id, sales=1)
+
+
+@receiver(post_delete, sender=Sale)
+def count_deleted_sale(sender, instance, **kwargs):
+    adjust_user_stats(instance.user_id, sales=-1, create=False)
+
+
+@receiver([post_save, post_delete], sender=SubscriptionPlan)
+def bump_subscription_plans_version(sender, instance, **kwargs):
+    """Plans changed: cached public pages and plan fragments must be re-rendered"""
+    bump_plans_version()
+    transaction.on_commit(bump_plans_version)
+
+
+connection_created.connect(install_query_recorder)
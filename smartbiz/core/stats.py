@@ -0,0 +1,123 @@
+"""Per-user running counts of products, stock levels and sales.
+
+Every product or sale write adjusts the owner's UserStats row with an F()
+increment inside its own transaction, so plan limits, dashboard tiles and
+notifications read one row instead of counting. Bulk writes send no
+signals and adjust the counts themselves. rebuild_user_stats recomputes
+the rows from the Product and Sale tables, after repairing the StockAlert
+rows the stock counts mirror.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from .models import Product, Sale, StockAlert, Subscription, UserStats
+
+LEVEL_FIELDS = {StockAlert.LOW: "low_stock_count", StockAlert.OUT: "out_of_stock_count"}
+
+
+def adjust_user_stats(user_id, products=0, sales=0, levels=None, create=True):
+    """Add to a user's counts; `levels` maps an alert level (or None) to a change in products at it.
+
+    Pass create=False on delete paths: when the owner is being deleted their
+    row is already gone, and must not be re-created.
+    """
+    deltas = {"product_count": products, "sale_count": sales}
+    for level, delta in (levels or {}).items():
+        if level is not None:
+            deltas[LEVEL_FIELDS[level]] = deltas.get(LEVEL_FIELDS[level], 0) + delta
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    stats = UserStats.objects.filter(user_id=user_id)
+    if stats.update(**{field: F(field) + delta for field, delta in deltas.items()}) or not create:
+        return
+    try:
+        with transaction.atomic():
+            # Rows are backfilled for existing users, so a missing one belongs to a new user
+            UserStats.objects.create(user_id=user_id, **deltas)
+    except IntegrityError:
+        stats.update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def get_user_stats(user):
+    """The user's counts; a user with no row yet has nothing to count"""
+    return UserStats.objects.filter(user=user).first() or UserStats(user=user)
+
+
+async def aget_user_stats(user):
+    return await UserStats.objects.filter(user=user).afirst() or UserStats(user=user)
+
+
+def product_allowance(user):
+    """How many more products the user's plan allows, or None for no limit.
+
+    Locks the user's stats row, so call it inside the transaction that
+    creates the products: concurrent creates then cannot both pass the check.
+    """
+    limit = Subscription.objects.filter(user=user).values_list("plan__max_products", flat=True).first()
+    if limit is None:
+        return None
+    stats = UserStats.objects.select_for_update().filter(user=user).first()
+    return max(limit - (stats.product_count if stats else 0), 0)
+
+
+def count_user_stats(user_ids):
+    """Fresh UserStats for `user_ids`, counted from the Product and Sale tables"""
+    stats = {user_id: UserStats(user_id=user_id) for user_id in user_ids}
+    # Same levels as alerts.stock_level
+    product_counts = (
+        Product.objects.filter(user_id__in=user_ids)
+        .values("user_id")
+        .annotate(
+            product_count=Count("id"),
+            out_of_stock_count=Count("id", filter=Q(quantity=0)),
+            low_stock_count=Count("id", filter=Q(quantity__gt=0, quantity__lt=F("reorder_level"))),
+        )
+        .order_by()
+    )
+    for row in product_counts:
+        user_id = row.pop("user_id")
+        for field, count in row.items():
+            setattr(stats[user_id], field, count)
+    sale_counts = (
+        Sale.objects.filter(user_id__in=user_ids).values_list("user_id").annotate(Count("id")).order_by()
+    )
+    for user_id, count in sale_counts:
+        stats[user_id].sale_count = count
+    return list(stats.values())
+
+
+def count_stock_alerts(user_ids):
+    """{user_id: {level: open alerts}} for `user_ids`, from the StockAlert table"""
+    counts = {user_id: {} for user_id in user_ids}
+    rows = StockAlert.objects.filter(user_id__in=user_ids).values_list("user_id", "level").annotate(Count("id"))
+    for user_id, level, count in rows.order_by():
+        counts[user_id][level] = count
+    return counts
+
+
+def rebuild_user_stats(users=None, batch_size=500):
+    """Recount the stats of `users` (default: everyone) a batch at a time; returns the number of rows written"""
+    # alerts imports this module to adjust the counts
+    from .alerts import repair_stock_alerts
+
+    users = (User.objects.all() if users is None else users).order_by("pk")
+    written = 0
+    last_pk = 0
+    while True:
+        user_ids = list(users.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+        if not user_ids:
+            return written
+        with transaction.atomic():
+            # The recount below overwrites the level counts this adjusts
+            repair_stock_alerts(Product.objects.filter(user_id__in=user_ids), batch_size)
+            UserStats.objects.bulk_create(
+                count_user_stats(user_ids),
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=["product_count", "low_stock_count", "out_of_stock_count", "sale_count"],
+            )
+        written += len(user_ids)
+        last_pk = user_ids[-1]
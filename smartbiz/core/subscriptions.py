@@ -0,0 +1,118 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analytics import PLATFORM_METRICS_CACHE_KEY
+from .models import Subscription
+from .utils import entitlement_cache_key, notifications_cache_key
+
+REMINDER_SUBJECT = "Your SmartBiz subscription expires on {end_date}"
+REMINDER_BODY = (
+    "Hi {username},\n\n"
+    "Your {plan} subscription ends on {end_date}. Renew before then to keep "
+    "recording sales and tracking stock without interruption.\n\n"
+    "SmartBiz"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def expire_lapsed_subscriptions(today=None):
+    """Mark every subscription whose end_date has passed as inactive.
+
+    The change is one UPDATE over the end_date/is_active index. An UPDATE
+    sends no post_save, so the owners' cached entitlement and notifications
+    and the admin metrics snapshot are dropped here instead. Returns the
+    number of subscriptions expired; a second run the same day expires none.
+    """
+    today = today or timezone.now().date()
+    lapsed = Subscription.objects.filter(is_active=True, end_date__lt=today)
+
+    with transaction.atomic():
+        user_ids = list(lapsed.values_list("user_id", flat=True))
+        if not user_ids:
+            return 0
+        expired = lapsed.update(is_active=False)
+
+    keys = [entitlement_cache_key(user_id) for user_id in user_ids]
+    keys += [notifications_cache_key(user_id, today) for user_id in user_ids]
+    cache.delete_many(keys + [PLATFORM_METRICS_CACHE_KEY])
+    return expired
+
+
+def due_for_reminder(today=None):
+    """Active subscriptions ending within SUBSCRIPTION_REMINDER_DAYS whose owner has not been reminded yet"""
+    today = today or timezone.now().date()
+    return (
+        Subscription.objects.filter(
+            is_active=True,
+            end_date__gte=today,
+            end_date__lte=today + timedelta(days=settings.SUBSCRIPTION_REMINDER_DAYS),
+        )
+        # Owners without an email address see the in-app notification instead
+        .exclude(user__email="")
+        # Renewing moves end_date on, which makes the subscription due again
+        .exclude(reminder_sent_for=F("end_date"))
+    )
+
+
+def send_renewal_reminders(today=None, chunk_size=None):
+    """Email owners whose subscription is about to end, a chunk at a time.
+
+    The run uses one mail server connection, and each chunk ends with one
+    UPDATE recording the end_date the reminders were for, so an interrupted
+    run resumes where it stopped and nobody is emailed twice about the same
+    end date. A message the server rejects is logged and left unrecorded,
+    to be retried on the next run. Returns the number of reminders sent.
+    """
+    chunk_size = chunk_size or settings.SUBSCRIPTION_REMINDER_CHUNK_SIZE
+    due = due_for_reminder(today).order_by("pk")
+    connection = get_connection()
+    try:
+        connection.open()
+    except OSError:
+        logger.exception("Could not connect to the mail server; no renewal reminders were sent")
+        return 0
+
+    sent = 0
+    last_pk = 0
+    try:
+        while True:
+            chunk = list(
+                due.filter(pk__gt=last_pk).values(
+                    "pk", "end_date", "plan__name", "user__username", "user__email"
+                )[:chunk_size]
+            )
+            if not chunk:
+                return sent
+
+            delivered = []
+            for row in chunk:
+                message = EmailMessage(
+                    REMINDER_SUBJECT.format(end_date=row["end_date"]),
+                    REMINDER_BODY.format(
+                        username=row["user__username"],
+                        plan=row["plan__name"],
+                        end_date=row["end_date"],
+                    ),
+                    to=[row["user__email"]],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except OSError:
+                    logger.warning("Renewal reminder to %s failed", row["user__username"], exc_info=True)
+                    continue
+                delivered.append(row["pk"])
+
+            Subscription.objects.filter(pk__in=delivered).update(reminder_sent_for=F("end_date"))
+            sent += len(delivered)
+            last_pk = chunk[-1]["pk"]
+    finally:
+        connection.close()
@@ -1,3 +1,1540 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import math
+import os
+import shutil
+import tempfile
+import warnings
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import add_sale_to_rollup
+from .exports import SALES_HEADER
+from .forecasting import forecast_products, subscriber_products
+from .imports import import_products
+from .inventory import InsufficientStock, sell_product
+from .metrics import registry as metrics_registry
+from .models import (
+    DailySales,
+    Product,
+    Sale,
+    StockAlert,
+    StockForecast,
+    Subscription,
+    SubscriptionPlan,
+    UserStats,
+)
+from .reports import compute_profit_report
+from .routers import PRIMARY_PIN_COOKIE, ReplicaRouter, replica_reads
+from .stats import count_user_stats
+from .subscriptions import expire_lapsed_subscriptions
+from .utils import (
+    date_range_q,
+    entitlement_cache_key,
+    get_data_version,
+    notifications_cache_key,
+    prefix_q,
+)
+from .views import store_dashboard_body, todays_sales
+
+
+# A test mirror is a separate connection that cannot see TestCase's uncommitted data,
+# and Basic-auth requests spend most of a second hashing the password
+@override_settings(REPLICA_DATABASE=None, SLOW_REQUEST_THRESHOLD_MS=10_000)
+class SmartBizTestCase(TestCase):
+    """Shared fixtures: one subscribed business owner with a small catalog"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = SubscriptionPlan.objects.create(name="Basic", price=499, duration_days=30)
+        cls.user = User.objects.create_user(username="owner", password="pass12345")
+        today = timezone.now().date()
+        Subscription.objects.create(
+            user=cls.user,
+            plan=cls.plan,
+            start_date=today,
+            end_date=today + timedelta(days=30),
+        )
+        cls.products = [
+            Product.objects.create(
+                user=cls.user,
+                name=f"Item {i}",
+                quantity=quantity,
+                buying_price=Decimal("50.00"),
+                selling_price=Decimal("80.00"),
+            )
+            for i, quantity in enumerate([0, 5, 20, 100])
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def make_sale(self, product, quantity, days_ago=0):
+        sale = Sale.objects.create(
+            user=product.user,
+            product=product,
+            quantity_sold=quantity,
+            total_price=quantity * product.selling_price,
+        )
+        if days_ago:
+            Sale.objects.filter(pk=sale.pk).update(
+                created_at=timezone.now() - timedelta(days=days_ago)
+            )
+            sale.refresh_from_db()
+        add_sale_to_rollup(sale)
+        return sale
+
+
+class DashboardTests(SmartBizTestCase):
+    CONTEXT_KEYS = {
+        "sales_today", "total_today", "total_week", "total_month", "total_all_time",
+        "all_time_transactions", "products", "low_stock_count", "out_of_stock",
+        "in_stock_count", "stock_health_percent", "top_products", "daily_sales",
+        "sales_count_today", "sales_count_week", "avg_sale_value", "daily_average",
+        "daily_average_percent",
+    }
+    MAX_QUERIES = 10
+
+    def seed_sales(self):
+        for days_ago in range(40):
+            for product in self.products[1:]:
+                self.make_sale(product, 1 + days_ago % 3, days_ago=days_ago)
+
+    def test_context_values(self):
+        self.make_sale(self.products[2], 2)
+        self.make_sale(self.products[3], 1, days_ago=3)
+        self.make_sale(self.products[3], 1, days_ago=20)
+        self.make_sale(self.products[3], 1, days_ago=90)
+
+        response = self.client.get(reverse("dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        self.assertTrue(self.CONTEXT_KEYS <= set(context.keys()))
+        self.assertEqual(context["total_today"], 160)
+        self.assertEqual(context["total_week"], 240)
+        self.assertEqual(context["total_month"], 320)
+        self.assertEqual(context["total_all_time"], 400)
+        self.assertEqual(context["all_time_transactions"], 4)
+        self.assertEqual(context["sales_count_today"], 1)
+        self.assertEqual(context["sales_count_week"], 2)
+        # Low and out of stock are separate buckets, read from the stats row
+        self.assertEqual(context["low_stock_count"], 1)
+        self.assertEqual(context["out_of_stock"], 1)
+        self.assertEqual(context["in_stock_count"], 2)
+        self.assertEqual(context["top_products"][0]["product__name"], "Item 3")
+
+        today = timezone.now().date()
+        daily_sales = json.loads(context["daily_sales"])
+        self.assertEqual(len(daily_sales), 7)
+        self.assertEqual(Decimal(daily_sales[today.strftime("%a")]), Decimal("160"))
+        self.assertEqual(
+            Decimal(daily_sales[(today - timedelta(days=3)).strftime("%a")]), Decimal("80")
+        )
+
+    def test_query_count_is_bounded(self):
+        self.seed_sales()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.MAX_QUERIES)
+
+
+class PageCacheTests(SmartBizTestCase):
+    def anonymous_landing(self, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(reverse("landing"), headers=headers)
+        return response, len(queries)
+
+    def test_landing_page_served_from_cache(self):
+        first, _ = self.anonymous_landing()
+        second, queries = self.anonymous_landing()
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(queries, 0)
+        self.assertTemplateNotUsed(second, "core/landing.html")
+        self.assertIn("public", second["Cache-Control"])
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_landing_page_revalidates_with_etag(self):
+        first, _ = self.anonymous_landing()
+        response, _ = self.anonymous_landing(if_none_match=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_plan_change_invalidates_public_pages(self):
+        self.anonymous_landing()
+        self.plan.price = 599
+        self.plan.save()
+
+        response, _ = self.anonymous_landing()
+        self.assertTemplateUsed(response, "core/landing.html")
+
+    def test_signed_in_landing_page_not_cached(self):
+        response = self.client.get(reverse("landing"))
+        self.assertNotIn("ETag", response)
+
+    def test_plan_cards_fragment_cached(self):
+        url = reverse("subscription_plans")
+        Subscription.objects.filter(user=self.user).delete()
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertContains(response, "KES 499")
+        self.assertFalse([q for q in queries if "core_subscriptionplan" in q["sql"]])
+
+        self.plan.price = 599
+        self.plan.save()
+        self.assertContains(self.client.get(url), "KES 599")
+
+    def test_dashboard_body_cached_until_next_sale(self):
+        url = reverse("dashboard")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if "core_sale" in q["sql"]])
+
+        self.client.post(reverse("record_sale", args=[self.products[3].id]), {"quantity_sold": 2})
+        response = self.client.get(url)
+        self.assertEqual(response.context["total_today"], 160)
+
+    def test_replica_body_not_cached_right_after_write(self):
+        @replica_reads
+        def view(request):
+            # A brand new data version is younger than REPLICA_PIN_SECONDS
+            store_dashboard_body("body", get_data_version(self.user.pk), "maybe stale")
+
+        with override_settings(REPLICA_DATABASE="default"):
+            view(RequestFactory().get("/"))
+        self.assertIsNone(cache.get("body"))
+
+        view(RequestFactory().get("/"))
+        self.assertEqual(cache.get("body"), "maybe stale")
+
+
+class ProfitReportTests(SmartBizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+
+    def test_totals_margin_and_growth(self):
+        self.make_sale(self.products[3], 1, days_ago=1)
+        self.make_sale(self.products[3], 2)
+
+        report = compute_profit_report(self.user, self.today - timedelta(days=1), self.today, "day")
+
+        self.assertEqual(report["totals"]["revenue"], Decimal("240.00"))
+        self.assertEqual(report["totals"]["cost"], Decimal("150.00"))
+        self.assertEqual(report["totals"]["profit"], Decimal("90.00"))
+        self.assertEqual(report["totals"]["margin_percent"], 37.5)
+        yesterday, today = report["periods"]
+        self.assertIsNone(yesterday["revenue_growth"])
+        self.assertEqual((today["revenue"], today["revenue_growth"]), (Decimal("160.00"), 100.0))
+
+    def test_abc_classes(self):
+        self.make_sale(self.products[3], 10)
+        self.make_sale(self.products[2], 2)
+        self.make_sale(self.products[1], 1)
+
+        report = compute_profit_report(self.user, self.today, self.today)
+
+        classes = {row["name"]: row["abc_class"] for row in report["products"]}
+        self.assertEqual(classes, {"Item 3": "A", "Item 2": "A", "Item 1": "B"})
+        self.assertEqual(report["abc_summary"]["A"]["count"], 2)
+
+    def test_weeks_start_on_monday(self):
+        report = compute_profit_report(self.user, self.today - timedelta(days=30), self.today, "week")
+        self.assertTrue(all(row["start"].weekday() == 0 for row in report["periods"]))
+        self.assertLessEqual(report["periods"][0]["start"], self.today - timedelta(days=30))
+
+    def test_cached_until_next_sale(self):
+        url = reverse("profit_report")
+        self.make_sale(self.products[3], 1)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"period": "bogus"})
+        self.assertEqual(response.context["period"], "month")
+        self.assertFalse([q for q in queries if "core_dailysales" in q["sql"]])
+
+        self.client.post(reverse("record_sale", args=[self.products[3].id]), {"quantity_sold": 1})
+        response = self.client.get(url)
+        self.assertEqual(response.context["totals"]["revenue"], Decimal("160.00"))
+
+
+class ForecastTests(SmartBizTestCase):
+    def forecast(self, product):
+        return StockForecast.objects.get(product=product)
+
+    def test_velocity_smoothing_and_reorder_point(self):
+        Product.objects.filter(pk=self.products[3].pk).update(
+            created_at=timezone.now() - timedelta(days=100)
+        )
+        # Two units a day for four weeks, then four a day for the last week
+        for days_ago in range(35):
+            self.make_sale(self.products[3], 4 if days_ago < 7 else 2, days_ago=days_ago)
+
+        with override_settings(FORECAST_HISTORY_DAYS=35, FORECAST_BATCH_SIZE=2):
+            call_command("forecast_demand", stdout=StringIO())
+
+        forecast = self.forecast(self.products[3])
+        self.assertAlmostEqual(forecast.velocity, 2.4, places=2)
+        # Recent days weigh most, so the smoothed rate leans towards 4
+        self.assertGreater(forecast.forecast_daily, 3)
+        self.assertGreater(forecast.reorder_point, forecast.forecast_daily * 7)
+        self.assertEqual(forecast.reorder_quantity, math.ceil(forecast.forecast_daily * 14))
+        # Every product of the subscriber gets a forecast, even without sales
+        self.assertEqual(self.forecast(self.products[2]).reorder_point, 0)
+
+    def test_history_before_creation_is_ignored(self):
+        for days_ago in range(3):
+            self.make_sale(self.products[3], 3, days_ago=days_ago)
+        forecast_products(subscriber_products())
+        self.assertAlmostEqual(self.forecast(self.products[3]).velocity, 3.0)
+
+    def test_lapsed_subscribers_skipped(self):
+        Subscription.objects.filter(user=self.user).update(is_active=False)
+        forecast_products(subscriber_products())
+        self.assertFalse(StockForecast.objects.exists())
+
+    def test_dashboard_and_product_list_show_suggestions(self):
+        for days_ago in range(10):
+            self.make_sale(self.products[3], 5, days_ago=days_ago)
+        Product.objects.filter(pk=self.products[3].pk).update(quantity=6)
+        forecast_products(subscriber_products())
+
+        dashboard = self.client.get(reverse("dashboard"))
+        self.assertEqual([f.product_id for f in dashboard.context["reorder_suggestions"]], [self.products[3].id])
+        self.assertContains(self.client.get(reverse("product_list")), "reorder 70")
+
+    def test_forecast_bumps_data_version(self):
+        version = get_data_version(self.user.pk)
+        call_command("forecast_demand", stdout=StringIO())
+        self.assertNotEqual(get_data_version(self.user.pk), version)
+
+
+class SalesRollupTests(SmartBizTestCase):
+    def test_record_sale_updates_rollup(self):
+        product = self.products[3]
+        url = reverse("record_sale", args=[product.id])
+        self.client.post(url, {"quantity_sold": 2})
+        self.client.post(url, {"quantity_sold": 3})
+
+        rollup = DailySales.objects.get(product=product)
+        self.assertEqual(rollup.date, timezone.now().date())
+        self.assertEqual(rollup.units, 5)
+        self.assertEqual(rollup.revenue, Decimal("400.00"))
+        self.assertEqual(rollup.transactions, 2)
+
+    def test_backfill_and_verify(self):
+        self.make_sale(self.products[2], 1)
+        self.make_sale(self.products[2], 2, days_ago=1)
+        self.make_sale(self.products[3], 4, days_ago=1)
+        DailySales.objects.all().delete()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_sales_rollup", verify=True, stdout=StringIO())
+
+        call_command("rebuild_sales_rollup", batch_size=2, stdout=StringIO())
+        self.assertEqual(DailySales.objects.count(), 3)
+        call_command("rebuild_sales_rollup", verify=True, stdout=StringIO())
+
+        DailySales.objects.filter(product=self.products[3]).update(units=1)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_sales_rollup", verify=True, stdout=StringIO())
+
+
+class RecordSaleTests(SmartBizTestCase):
+    def test_sale_decrements_stock(self):
+        product = self.products[2]
+        response = self.client.post(reverse("record_sale", args=[product.id]), {"quantity_sold": 5})
+
+        self.assertRedirects(response, reverse("dashboard"))
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 15)
+        self.assertEqual(Sale.objects.get(product=product).total_price, Decimal("400.00"))
+
+    def test_insufficient_stock_is_rejected(self):
+        product = self.products[1]
+        response = self.client.post(reverse("record_sale", args=[product.id]), {"quantity_sold": 6})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["error"])
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 5)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(DailySales.objects.exists())
+
+    def test_stale_read_cannot_oversell(self):
+        # Two cashiers load the product while 5 units are left
+        first = Product.objects.get(pk=self.products[1].pk)
+        second = Product.objects.get(pk=self.products[1].pk)
+
+        sell_product(first, 4)
+        with self.assertRaises(InsufficientStock):
+            sell_product(second, 4)
+
+        first.refresh_from_db()
+        self.assertEqual(first.quantity, 1)
+        self.assertEqual(Sale.objects.count(), 1)
+
+
+class SalesHistoryTests(SmartBizTestCase):
+    def test_pages_walk_every_sale_once(self):
+        sales = [self.make_sale(self.products[3], 1, days_ago=i % 4) for i in range(7)]
+        url = reverse("sales_history")
+
+        seen = []
+        params = {"page_size": 3}
+        while True:
+            response = self.client.get(url, params)
+            seen += [sale.id for sale in response.context["sales"]]
+            if not response.context["next_cursor"]:
+                break
+            params["cursor"] = response.context["next_cursor"]
+
+        expected = sorted(sales, key=lambda sale: (sale.created_at, sale.id), reverse=True)
+        self.assertEqual(seen, [sale.id for sale in expected])
+        self.assertEqual(response.context["transactions"], 7)
+
+    def test_filters_and_totals(self):
+        self.make_sale(self.products[2], 2)
+        self.make_sale(self.products[3], 1)
+        self.make_sale(self.products[3], 3, days_ago=10)
+        today = timezone.now().date()
+
+        response = self.client.get(reverse("sales_history"), {
+            "start": (today - timedelta(days=1)).isoformat(),
+            "product": self.products[3].id,
+        })
+
+        self.assertEqual([sale.quantity_sold for sale in response.context["sales"]], [1])
+        self.assertEqual(response.context["total_revenue"], Decimal("80"))
+        self.assertEqual(response.context["transactions"], 1)
+
+    def test_query_count_does_not_grow_with_history(self):
+        for i in range(60):
+            self.make_sale(self.products[i % 4], 1, days_ago=i % 10)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("sales_history"), {"page_size": 50})
+
+        self.assertEqual(len(response.context["sales"]), 50)
+        self.assertLessEqual(len(queries), 8)
+
+    def test_bad_cursor_starts_from_first_page(self):
+        self.make_sale(self.products[3], 1)
+        response = self.client.get(reverse("sales_history"), {"cursor": "not-a-cursor"})
+        self.assertEqual(len(response.context["sales"]), 1)
+
+
+class ReplicaRouterTests(SmartBizTestCase):
+    def route(self, request):
+        @replica_reads
+        def view(request):
+            router = ReplicaRouter()
+            return router.db_for_read(Sale), router.db_for_read(Session)
+
+        return view(request)
+
+    def test_without_replica_everything_uses_primary(self):
+        self.assertEqual(self.route(RequestFactory().get("/")), (None, None))
+
+    @override_settings(REPLICA_DATABASE="replica")
+    def test_analytics_reads_use_replica(self):
+        router = ReplicaRouter()
+        self.assertEqual(self.route(RequestFactory().get("/")), ("replica", None))
+        self.assertIsNone(router.db_for_read(Sale))
+        self.assertEqual(router.db_for_write(Sale), "default")
+
+    @override_settings(REPLICA_DATABASE="replica")
+    def test_pinned_client_reads_primary(self):
+        request = RequestFactory().get("/", headers={"cookie": f"{PRIMARY_PIN_COOKIE}=1"})
+        self.assertEqual(self.route(request), (None, None))
+
+    @override_settings(REPLICA_DATABASE="default")
+    def test_recording_a_sale_pins_the_client(self):
+        response = self.client.get(reverse("dashboard"))
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        response = self.client.post(reverse("record_sale", args=[self.products[3].id]), {"quantity_sold": 1})
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]["max-age"], 10)
+
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["sales_count_today"], 1)
+
+    @override_settings(REPLICA_DATABASE="replica")
+    def test_api_reads_use_primary_without_a_pin(self):
+        # A Basic-auth client keeps no cookies, so nothing pins it after a write
+        credentials = base64.b64encode(b"owner:pass12345").decode()
+        api = Client(headers={"authorization": f"Basic {credentials}"})
+        api.post(
+            reverse("api_sales_batch"),
+            json.dumps({"sales": [{"product_id": self.products[3].id, "quantity_sold": 1}]}),
+            content_type="application/json",
+        )
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            routed.append(db_for_read(router, model, **hints))
+            return routed[-1]
+
+        with mock.patch.object(ReplicaRouter, "db_for_read", record):
+            for name in ("api_products", "api_sales", "api_dashboard"):
+                api.cookies.clear()
+                self.assertEqual(api.get(reverse(name)).status_code, 200)
+
+        self.assertTrue(routed)
+        self.assertEqual(set(routed), {None})
+        self.assertEqual(api.get(reverse("api_dashboard")).json()["sales"]["sales_count_today"], 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "checks the SQLite profile's pragmas")
+class DatabaseProfileTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            return cursor.execute(f"PRAGMA {name}").fetchone()[0]
+
+    def test_connection_pragmas(self):
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(self.pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma("cache_size"), -20000)
+
+    def test_wal_on_file_database(self):
+        # The test database is in memory, where journal_mode is always "memory"
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = connections["default"].__class__({**connection.settings_dict, "NAME": os.path.join(directory, "wal.sqlite3")})
+            try:
+                with wrapper.cursor() as cursor:
+                    self.assertEqual(cursor.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            finally:
+                wrapper.close()
+
+
+@skipUnless(connection.vendor == "sqlite", "plan assertions use SQLite's EXPLAIN QUERY PLAN format")
+class QueryPlanTests(SmartBizTestCase):
+    """Hot per-user queries must search an index, never scan the table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = User.objects.create_user(username="other")
+        for owner in (cls.user, other):
+            product = Product.objects.create(
+                user=owner, name="Seed", quantity=3, buying_price=1, selling_price=2
+            )
+            Sale.objects.bulk_create(
+                Sale(user=owner, product=product, quantity_sold=1, total_price=2)
+                for _ in range(200)
+            )
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index_name}", plan)
+        self.assertNotRegex(plan, r"\bSCAN core_")
+
+    def test_dashboard_queries(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            Sale.objects.filter(date_range_q(today, today), user=self.user).order_by("-created_at"),
+            "sale_user_created_idx",
+        )
+        self.assertUsesIndex(
+            DailySales.objects.filter(user=self.user, date__gte=today - timedelta(days=30)),
+            "dailysales_user_date_idx",
+        )
+
+    def test_sales_history_queries(self):
+        ordering = ("-created_at", "-id")
+        self.assertUsesIndex(
+            Sale.objects.filter(user=self.user).order_by(*ordering)[:51],
+            "sale_user_created_idx",
+        )
+        self.assertUsesIndex(
+            Sale.objects.filter(user=self.user, product=self.products[3]).order_by(*ordering)[:51],
+            "sale_product_created_idx",
+        )
+
+    def test_notification_queries(self):
+        self.assertUsesIndex(
+            Product.objects.filter(user=self.user, quantity__lt=10, quantity__gt=0),
+            "product_user_quantity_idx",
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(user=self.user, quantity=0),
+            "product_user_quantity_idx",
+        )
+
+    def test_product_search_query(self):
+        self.assertUsesIndex(
+            Product.objects.filter(user=self.user).filter(prefix_q("name_lower", "se")).order_by("name_lower", "id")[:51],
+            "product_user_name_idx",
+        )
+
+    def test_admin_due_subscriptions_query(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            Subscription.objects.filter(
+                is_active=True, end_date__lte=today + timedelta(days=7), end_date__gte=today
+            ),
+            "subscription_end_active_idx",
+        )
+
+
+class NotificationsTests(SmartBizTestCase):
+    def messages(self, response):
+        return [n["message"] for n in response.context["notifications"]]
+
+    def test_cached_between_renders(self):
+        self.client.get(reverse("subscription_status"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("subscription_status"))
+
+        self.assertEqual(len(self.messages(response)), 2)
+        self.assertFalse([q for q in queries if "quantity" in q["sql"] and "COUNT" in q["sql"]])
+
+    def test_fresh_after_stock_change(self):
+        self.client.get(reverse("subscription_status"))
+        product = self.products[0]
+        product.quantity = 50
+        product.save()
+
+        response = self.client.get(reverse("subscription_status"))
+        self.assertFalse(any("out-of-stock" in message for message in self.messages(response)))
+
+    def test_fresh_after_sale(self):
+        self.client.get(reverse("subscription_status"))
+        self.client.post(reverse("record_sale", args=[self.products[1].id]), {"quantity_sold": 5})
+
+        response = self.client.get(reverse("subscription_status"))
+        self.assertIn("❌ You have 2 out-of-stock product(s)!", self.messages(response))
+
+    def test_not_computed_when_unused(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("landing"))
+
+        self.assertFalse([q for q in queries if "core_product" in q["sql"]])
+        self.assertIsNone(cache.get(notifications_cache_key(self.user.pk)))
+
+
+class StockAlertTests(SmartBizTestCase):
+    def alerts(self):
+        return dict(StockAlert.objects.filter(user=self.user).values_list("product__name", "level"))
+
+    def test_fixture_products_have_alerts(self):
+        self.assertEqual(self.alerts(), {"Item 0": StockAlert.OUT, "Item 1": StockAlert.LOW})
+
+    def test_sale_raises_alert_only_when_crossing(self):
+        product = self.products[2]
+        sell_product(product, 5)
+        self.assertNotIn("Item 2", self.alerts())
+
+        with CaptureQueriesContext(connection) as queries:
+            sell_product(product, 6)
+        self.assertEqual(self.alerts()["Item 2"], StockAlert.LOW)
+        self.assertEqual(len([q for q in queries if "core_stockalert" in q["sql"]]), 1)
+
+        # Still low: no alert write
+        with CaptureQueriesContext(connection) as queries:
+            sell_product(product, 1)
+        self.assertFalse([q for q in queries if "core_stockalert" in q["sql"]])
+
+        sell_product(product, 8)
+        self.assertEqual(self.alerts()["Item 2"], StockAlert.OUT)
+
+    def test_edit_clears_alert_and_honours_reorder_level(self):
+        url = reverse("product_edit", args=[self.products[0].id])
+        fields = {"name": "Item 0", "buying_price": "50", "selling_price": "80"}
+        self.client.post(url, {**fields, "quantity": 30, "reorder_level": 10})
+        self.assertNotIn("Item 0", self.alerts())
+
+        self.client.post(url, {**fields, "quantity": 30, "reorder_level": 50})
+        self.assertEqual(self.alerts()["Item 0"], StockAlert.LOW)
+
+    def test_import_raises_alerts(self):
+        lines = StringIO("name,quantity,reorder_level,buying_price,selling_price\nA,0,,1,2\nB,4,,1,2\nC,4,3,1,2\n")
+        import_products(self.user, lines)
+        alerts = self.alerts()
+        self.assertEqual((alerts["A"], alerts["B"]), (StockAlert.OUT, StockAlert.LOW))
+        self.assertNotIn("C", alerts)
+
+    def test_notifications_read_the_stats_row(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("subscription_status"))
+
+        self.assertEqual(len(response.context["notifications"]), 2)
+        self.assertEqual(len([q for q in queries if "core_userstats" in q["sql"]]), 1)
+        self.assertFalse([q for q in queries if "core_stockalert" in q["sql"] or "core_product" in q["sql"]])
+
+
+class UserStatsTests(SmartBizTestCase):
+    FIELDS = ("product_count", "low_stock_count", "out_of_stock_count", "sale_count")
+
+    def assertStatsMatchTables(self):
+        stored = UserStats.objects.get(user=self.user)
+        expected = count_user_stats([self.user.pk])[0]
+        self.assertEqual(
+            [getattr(stored, f) for f in self.FIELDS],
+            [getattr(expected, f) for f in self.FIELDS],
+        )
+
+    def post_product(self, name):
+        return self.client.post(reverse("product_create"), {
+            "name": name, "quantity": 3, "buying_price": "1", "selling_price": "2",
+        })
+
+    def test_counts_follow_every_write(self):
+        self.assertStatsMatchTables()
+        sell_product(self.products[1], 5)
+        self.post_product("Tea")
+        product = self.products[0]
+        product.quantity = 50
+        product.save()
+        import_products(self.user, StringIO("name,quantity,buying_price,selling_price\nA,0,1,2\nB,4,1,2\n"))
+        self.client.post(reverse("product_delete", args=[Product.objects.get(name="A").id]))
+        self.client.post(
+            reverse("api_sales_sync"),
+            json.dumps({"sales": [{
+                "key": "k1", "product_id": self.products[3].id, "quantity_sold": 95,
+                "sold_at": timezone.now().isoformat(),
+            }]}),
+            content_type="application/json",
+        )
+
+        self.assertStatsMatchTables()
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.product_count, stats.sale_count), (6, 2))
+
+    def test_plan_limit_reads_the_counter(self):
+        SubscriptionPlan.objects.filter(pk=self.plan.pk).update(max_products=5)
+        with CaptureQueriesContext(connection) as queries:
+            self.post_product("Fifth")
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"]])
+
+        response = self.post_product("Sixth")
+        self.assertContains(response, "product limit")
+        self.assertFalse(Product.objects.filter(name="Sixth").exists())
+
+        result = import_products(self.user, StringIO("name,quantity,buying_price,selling_price\nA,1,1,2\n"))
+        self.assertEqual((result.created, result.error_count), (0, 1))
+
+        response = self.client.post(
+            reverse("api_products_batch"),
+            json.dumps({"products": [{"name": "C", "quantity": 1, "buying_price": 1, "selling_price": 2}]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Product.objects.filter(user=self.user).count(), 5)
+
+    def test_deleting_an_owner_with_products(self):
+        owner = User.objects.create_user(username="leaving")
+        for name in ("A", "B"):
+            Product.objects.create(user=owner, name=name, quantity=0, buying_price=1, selling_price=2)
+
+        owner.delete()
+
+        self.assertFalse(UserStats.objects.filter(user_id=owner.pk).exists())
+        self.assertFalse(Product.objects.filter(user_id=owner.pk).exists())
+
+    def test_repair_command(self):
+        UserStats.objects.filter(user=self.user).update(product_count=0, sale_count=7)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_user_stats", "--verify", stdout=StringIO())
+
+        call_command("rebuild_user_stats", stdout=StringIO())
+        self.assertStatsMatchTables()
+        call_command("rebuild_user_stats", "--verify", stdout=StringIO())
+
+    def test_repair_command_fixes_stock_alerts(self):
+        # Queryset updates skip the signals that keep alerts in step
+        Product.objects.filter(pk=self.products[2].pk).update(quantity=0)
+        StockAlert.objects.filter(product=self.products[0]).delete()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_user_stats", "--verify", stdout=StringIO())
+
+        call_command("rebuild_user_stats", batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            dict(StockAlert.objects.filter(user=self.user).values_list("product__name", "level")),
+            {"Item 0": StockAlert.OUT, "Item 1": StockAlert.LOW, "Item 2": StockAlert.OUT},
+        )
+        self.assertStatsMatchTables()
+        call_command("rebuild_user_stats", "--verify", stdout=StringIO())
+        response = self.client.get(reverse("product_list"), {"stock": "out"})
+        self.assertEqual([p.name for p in response.context["products"]], ["Item 0", "Item 2"])
+
+
+class EntitlementTests(SmartBizTestCase):
+    def subscription_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q for q in queries if "core_subscription" in q["sql"]]
+
+    def test_cached_check_skips_subscription_lookup(self):
+        url = reverse("product_list")
+        _, cold = self.subscription_queries(url)
+        response, warm = self.subscription_queries(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(cold)
+        self.assertEqual(warm, [])
+
+    def test_admin_toggle_takes_effect_immediately(self):
+        url = reverse("product_list")
+        self.client.get(url)
+        admin = User.objects.create_user(username="admin", password="pass12345", is_staff=True)
+        self.client.force_login(admin)
+        self.client.post(reverse("toggle_subscription_status", args=[self.user.subscription.id]))
+
+        self.client.force_login(self.user)
+        self.assertRedirects(self.client.get(url), reverse("subscription_expired"))
+
+    def test_renewal_takes_effect_immediately(self):
+        Subscription.objects.filter(user=self.user).update(is_active=False)
+        url = reverse("product_list")
+        self.assertRedirects(self.client.get(url), reverse("subscription_expired"))
+
+        self.client.post(reverse("renew_subscription", args=[self.plan.id]))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_active_result_never_outlives_end_date(self):
+        Subscription.objects.filter(user=self.user).update(end_date=timezone.now().date())
+
+        with mock.patch("core.utils.cache") as fake_cache:
+            fake_cache.get.return_value = None
+            self.client.get(reverse("product_list"))
+
+        key = entitlement_cache_key(self.user.pk)
+        (timeout,) = [c.args[2] for c in fake_cache.set.call_args_list if c.args[0] == key]
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        midnight = timezone.make_aware(datetime.combine(tomorrow, time.min))
+        self.assertLessEqual(timeout, (midnight - timezone.now()).total_seconds())
+
+
+class SubscriptionMaintenanceTests(SmartBizTestCase):
+    def add_owner(self, name, days_left, email="owner@example.com"):
+        user = User.objects.create_user(username=name, email=email)
+        return Subscription.objects.create(
+            user=user,
+            plan=self.plan,
+            end_date=timezone.now().date() + timedelta(days=days_left),
+        )
+
+    def run_command(self):
+        out = StringIO()
+        call_command("expire_subscriptions", chunk_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_expires_lapsed_subscriptions_in_one_update(self):
+        lapsed = [self.add_owner(f"lapsed{i}", -1 - i) for i in range(3)]
+        current = self.add_owner("current", 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            expired = expire_lapsed_subscriptions()
+
+        self.assertEqual(expired, 3)
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("UPDATE")]), 1)
+        self.assertFalse(Subscription.objects.filter(pk__in=[s.pk for s in lapsed], is_active=True))
+        current.refresh_from_db()
+        self.assertTrue(current.is_active)
+        self.assertEqual(expire_lapsed_subscriptions(), 0)
+
+    def test_expiry_invalidates_cached_entitlement(self):
+        url = reverse("product_list")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        Subscription.objects.filter(user=self.user).update(
+            end_date=timezone.now().date() - timedelta(days=1)
+        )
+        # Cached as active until the UPDATE below drops it
+        cache.set(entitlement_cache_key(self.user.pk), "active")
+
+        expire_lapsed_subscriptions()
+        self.assertRedirects(self.client.get(url), reverse("subscription_expired"))
+
+    def test_reminders_sent_once_per_end_date(self):
+        for i in range(5):
+            self.add_owner(f"due{i}", i + 1)
+        self.add_owner("later", 20)
+        self.add_owner("no-email", 2, email="")
+
+        output = self.run_command()
+
+        self.assertIn("Sent 5 renewal reminder(s)", output)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].to, ["owner@example.com"])
+        self.assertIn("Sent 0 renewal reminder(s)", self.run_command())
+        self.assertEqual(len(mail.outbox), 5)
+
+        # Renewing moves the end date, so the owner is reminded about the new one
+        Subscription.objects.filter(user__username="due0").update(
+            end_date=F("end_date") + timedelta(days=2)
+        )
+        self.assertIn("Sent 1 renewal reminder(s)", self.run_command())
+
+    def test_failed_reminders_are_retried_next_run(self):
+        self.add_owner("bounces", 2, email="bounces@example.com")
+        self.add_owner("fine", 2)
+        real_send = mail.EmailMessage.send
+
+        def send(message, *args, **kwargs):
+            if message.to == ["bounces@example.com"]:
+                raise ConnectionRefusedError("mailbox unavailable")
+            return real_send(message, *args, **kwargs)
+
+        with mock.patch.object(mail.EmailMessage, "send", send), self.assertLogs("core.subscriptions", "WARNING"):
+            self.assertIn("Sent 1 renewal reminder(s)", self.run_command())
+        self.assertIn("Sent 1 renewal reminder(s)", self.run_command())
+        self.assertEqual([m.to for m in mail.outbox], [["owner@example.com"], ["bounces@example.com"]])
+
+    def test_unreachable_mail_server_does_not_stop_expiry(self):
+        lapsed = self.add_owner("lapsed", -1)
+        self.add_owner("due", 2)
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.open", side_effect=ConnectionRefusedError), \
+                self.assertLogs("core.subscriptions", "ERROR"):
+            output = self.run_command()
+
+        self.assertIn("Sent 0 renewal reminder(s)", output)
+        lapsed.refresh_from_db()
+        self.assertFalse(lapsed.is_active)
+
+    def test_owner_without_email_is_notified_in_app(self):
+        subscription = self.add_owner("no-email", 2, email="")
+        self.client.force_login(subscription.user)
+        response = self.client.get(reverse("subscription_status"))
+        self.assertTrue(any("expires in 2 days" in n["message"] for n in response.context["notifications"]))
+
+
+class AdminDashboardTests(SmartBizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username="admin", password="pass12345", is_staff=True)
+        self.client.force_login(self.admin)
+
+    def add_subscribers(self, count, **subscription):
+        today = timezone.now().date()
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f"shop{i}")
+            Subscription.objects.create(
+                user=user,
+                plan=self.plan,
+                end_date=subscription.get("end_date", today + timedelta(days=30)),
+                is_active=subscription.get("is_active", True),
+            )
+
+    def test_metrics(self):
+        today = timezone.now().date()
+        self.add_subscribers(2)
+        self.add_subscribers(1, end_date=today + timedelta(days=3))
+        self.add_subscribers(1, is_active=False)
+        User.objects.filter(subscription__is_active=False).update(is_active=False)
+
+        response = self.client.get(reverse("admin_dashboard"), {"refresh": 1})
+
+        context = response.context
+        self.assertEqual(context["total_users"], 5)
+        self.assertEqual(context["inactive_users"], 1)
+        self.assertEqual(context["total_subscriptions"], 5)
+        self.assertEqual(context["active_subscriptions"], 4)
+        self.assertEqual(context["expired_subscriptions"], 1)
+        self.assertEqual(context["due_subscriptions"], 1)
+        self.assertEqual(context["total_revenue"], Decimal("1996"))
+
+    def test_refresh_command_needs_a_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, "REDIS_URL"):
+            call_command("refresh_platform_metrics", stdout=StringIO())
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": cache_dir}}
+        with override_settings(CACHES=shared):
+            out = StringIO()
+            call_command("refresh_platform_metrics", stdout=out)
+        self.assertIn("Refreshed platform metrics: 1 users", out.getvalue())
+
+    def test_query_count_is_constant(self):
+        self.add_subscribers(30)
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(reverse("admin_dashboard"), {"refresh": 1})
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(reverse("admin_dashboard"))
+
+        self.assertEqual(len([q for q in cold if "core_subscription" in q["sql"]]), 1)
+        self.assertFalse([q for q in warm if "core_subscription" in q["sql"]])
+        self.assertLessEqual(len(cold), 4)
+
+    def test_user_list_is_one_query_per_page(self):
+        self.add_subscribers(30)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin_users"), {"page_size": 20})
+
+        self.assertEqual(len(response.context["users"]), 20)
+        self.assertIsNotNone(response.context["next_cursor"])
+        listing = [q for q in queries if "auth_user" in q["sql"] and "core_subscription" in q["sql"]]
+        self.assertEqual(len(listing), 1)
+        self.assertIn("core_userstats", listing[0]["sql"])
+        self.assertLessEqual(len(queries), 5)
+
+    def test_user_list_search_sort_and_pages(self):
+        self.add_subscribers(3)
+        self.user.email = "owner@shop.example"
+        self.user.save()
+        url = reverse("admin_users")
+
+        found = self.client.get(url, {"q": "OWNER@"}).context["users"]
+        self.assertEqual([u.username for u in found], ["owner"])
+
+        first = self.client.get(url, {"sort": "products", "page_size": 2}).context
+        self.assertEqual((first["users"][0].username, first["users"][0].product_count), ("owner", 4))
+        rest = self.client.get(url, {"sort": "products", "page_size": 2, "cursor": first["next_cursor"]}).context
+        names = [u.username for u in first["users"]] + [u.username for u in rest["users"]]
+        self.assertEqual(len(set(names)), 4)
+        self.assertIsNone(rest["next_cursor"])
+
+    def test_subscription_list(self):
+        self.add_subscribers(4)
+        url = reverse("admin_subscriptions")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"sort": "username", "page_size": 3})
+
+        subscriptions = response.context["subscriptions"]
+        self.assertEqual([s.username for s in subscriptions], ["owner", "shop2", "shop3"])
+        self.assertEqual(subscriptions[0].product_count, 4)
+        self.assertEqual(len([q for q in queries if "core_subscription" in q["sql"]]), 1)
+
+        found = self.client.get(url, {"q": "shop5"}).context["subscriptions"]
+        self.assertEqual([s.user.username for s in found], ["shop5"])
+
+
+class ProductListTests(SmartBizTestCase):
+    def names(self, response):
+        return [product.name for product in response.context["products"]]
+
+    def test_prefix_search_is_case_insensitive(self):
+        Product.objects.create(
+            user=self.user, name="sugar 1kg", quantity=30, buying_price=1, selling_price=2
+        )
+        Product.objects.create(
+            user=self.user, name="Brown Sugar", quantity=30, buying_price=1, selling_price=2
+        )
+
+        response = self.client.get(reverse("product_list"), {"q": "SUG"})
+        self.assertEqual(self.names(response), ["sugar 1kg"])
+
+    def test_search_folds_non_ascii_case(self):
+        product = Product.objects.create(
+            user=self.user, name="Éclair", quantity=30, buying_price=1, selling_price=2
+        )
+        response = self.client.get(reverse("product_list"), {"q": "écl"})
+        self.assertEqual(self.names(response), ["Éclair"])
+        response = self.client.get(reverse("api_products"), {"q": "ÉCL"})
+        self.assertEqual([p["name"] for p in response.json()["results"]], ["Éclair"])
+
+        product.name = "Ölkanne"
+        product.save(update_fields=["name"])
+        self.client.post(
+            reverse("api_products_batch"),
+            json.dumps({"products": [{"id": self.products[0].id, "name": "Øl"}]}),
+            content_type="application/json",
+        )
+        response = self.client.get(reverse("product_list"), {"q": "öl"})
+        self.assertEqual(self.names(response), ["Ölkanne"])
+        response = self.client.get(reverse("product_list"), {"q": "øl"})
+        self.assertEqual(self.names(response), ["Øl"])
+
+    def test_search_ending_in_the_last_code_point(self):
+        response = self.client.get(reverse("product_list"), {"q": "item\U0010ffff"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(response), [])
+
+    def test_search_ending_before_the_surrogates(self):
+        Product.objects.create(user=self.user, name="item\ud7ff\ue000", quantity=1, buying_price=1, selling_price=2)
+        response = self.client.get(reverse("product_list"), {"q": "item\ud7ff"})
+        self.assertEqual(self.names(response), ["item\ud7ff\ue000"])
+        response = self.client.get(reverse("api_products"), {"q": "item\ud7ff"})
+        self.assertEqual([p["name"] for p in response.json()["results"]], ["item\ud7ff\ue000"])
+
+    def test_stock_filters(self):
+        url = reverse("product_list")
+        self.assertEqual(self.names(self.client.get(url, {"stock": "out"})), ["Item 0"])
+        self.assertEqual(self.names(self.client.get(url, {"stock": "low"})), ["Item 1"])
+        self.assertEqual(self.names(self.client.get(url, {"stock": "healthy"})), ["Item 2", "Item 3"])
+
+    def test_pagination(self):
+        url = reverse("product_list")
+        first = self.client.get(url, {"page_size": 3})
+        second = self.client.get(url, {"page_size": 3, "cursor": first.context["next_cursor"]})
+
+        self.assertEqual(self.names(first), ["Item 0", "Item 1", "Item 2"])
+        self.assertEqual(self.names(second), ["Item 3"])
+        self.assertIsNone(second.context["next_cursor"])
+
+
+class ProductImportTests(SmartBizTestCase):
+    CSV = (
+        "name,quantity,buying_price,selling_price\n"
+        "Rice 10kg,40,900,1100\n"
+        ",3,1,2\n"
+        "Beans,lots,1,2\n"
+        "Salt,12,20.5,35\n"
+        "Oil,5,-1,2\n"
+        "Maize flour,0,100,130.25\n"
+    )
+
+    def test_upload_imports_valid_rows_and_reports_errors(self):
+        upload = SimpleUploadedFile("catalog.csv", self.CSV.encode(), content_type="text/csv")
+        response = self.client.post(reverse("product_import"), {"file": upload})
+
+        result = response.context["result"]
+        self.assertEqual(result.created, 3)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 6])
+        salt = Product.objects.get(user=self.user, name="Salt")
+        self.assertEqual((salt.quantity, salt.buying_price), (12, Decimal("20.50")))
+
+    def test_rows_are_inserted_in_batches(self):
+        rows = "".join(f"Item {i},1,1,2\n" for i in range(10))
+        lines = StringIO("name,quantity,buying_price,selling_price\n" + rows)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = import_products(self.user, lines, batch_size=4)
+
+        inserts = [q for q in queries if q["sql"].startswith('INSERT INTO "core_product"')]
+        self.assertEqual(result.created, 10)
+        self.assertEqual(len(inserts), 3)
+
+    def test_missing_columns(self):
+        result = import_products(self.user, StringIO("name,quantity\nRice,1\n"))
+        self.assertEqual(result.created, 0)
+        self.assertIn("buying_price", result.errors[0][1])
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(self.CSV)
+        self.addCleanup(os.remove, csv_file.name)
+
+        out = StringIO()
+        call_command("import_products", csv_file.name, user="owner", stdout=out)
+        self.assertIn("Imported 3 product(s)", out.getvalue())
+
+    def test_malformed_csv_is_reported(self):
+        content = "name,quantity,buying_price,selling_price\nRice,1,1,2\n" + "x" * (csv.field_size_limit() + 1) + ",1,1,2\n"
+        upload = SimpleUploadedFile("catalog.csv", content.encode(), content_type="text/csv")
+        response = self.client.post(reverse("product_import"), {"file": upload})
+        self.assertIn("not valid CSV", response.context["error"])
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(content)
+        self.addCleanup(os.remove, csv_file.name)
+        with self.assertRaisesMessage(CommandError, "not valid CSV"):
+            call_command("import_products", csv_file.name, user="owner", stdout=StringIO())
+        self.assertFalse(Product.objects.filter(name="Rice").exists())
+
+
+class ExportTests(SmartBizTestCase):
+    def read_csv(self, response):
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        return list(csv.reader(StringIO(content)))
+
+    def test_sales_export_with_date_range(self):
+        self.make_sale(self.products[3], 2)
+        self.make_sale(self.products[2], 1, days_ago=5)
+        today = timezone.now().date()
+
+        response = self.client.get(reverse("export_sales"), {"start": today.isoformat()})
+        rows = self.read_csv(response)
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(rows[0], ["created_at", "product", "quantity_sold", "total_price"])
+        self.assertEqual([row[1:] for row in rows[1:]], [["Item 3", "2", "160.00"]])
+
+    def test_products_export_round_trips_through_import(self):
+        rows = self.read_csv(self.client.get(reverse("export_products")))
+
+        self.assertEqual(len(rows), 5)
+        lines = StringIO("\n".join(",".join(row) for row in rows))
+        other = User.objects.create_user(username="other")
+        self.assertEqual(import_products(other, lines).created, 4)
+
+    @override_settings(ROOT_URLCONF="smartbiz.urls_asgi")
+    async def test_async_export_streams_asynchronously(self):
+        await sync_to_async(self.make_sale)(self.products[3], 2)
+        await self.async_client.aforce_login(self.user)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            response = await self.async_client.get(reverse("export_sales"))
+            content = b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertTrue(response.is_async)
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], SALES_HEADER)
+        self.assertEqual([row[1:] for row in rows[1:]], [["Item 3", "2", "160.00"]])
+
+
+class ApiTests(SmartBizTestCase):
+    def post_json(self, name, payload, **extra):
+        return self.client.post(
+            reverse(name), json.dumps(payload), content_type="application/json", **extra
+        )
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        response = self.client.get(reverse("api_products"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_basic_auth(self):
+        self.client.logout()
+        credentials = base64.b64encode(b"owner:pass12345").decode()
+        response = self.client.get(reverse("api_products"), HTTP_AUTHORIZATION=f"Basic {credentials}")
+        self.assertEqual(len(response.json()["results"]), 4)
+
+    def test_conditional_get(self):
+        url = reverse("api_sales")
+        first = self.client.get(url)
+        etag = first["ETag"]
+        self.assertTrue(first.has_header("Last-Modified"))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse("record_sale", args=[self.products[3].id]), {"quantity_sold": 1})
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()["results"]), 1)
+
+    def test_products_batch_creates_and_updates(self):
+        response = self.post_json("api_products_batch", {"products": [
+            {"name": "Tea", "quantity": 3, "buying_price": "10", "selling_price": 15},
+            {"id": self.products[2].id, "selling_price": "95.50"},
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Product.objects.filter(user=self.user, name="Tea").exists())
+        self.products[2].refresh_from_db()
+        self.assertEqual(self.products[2].selling_price, Decimal("95.50"))
+        self.assertEqual(self.products[2].quantity, 20)
+
+    def test_products_batch_is_all_or_nothing(self):
+        other = Product.objects.create(
+            user=User.objects.create_user(username="other"),
+            name="Theirs", quantity=1, buying_price=1, selling_price=2,
+        )
+        response = self.post_json("api_products_batch", {"products": [
+            {"name": "Tea", "quantity": 3, "buying_price": "10", "selling_price": 15},
+            {"id": other.id, "name": "Mine now"},
+        ]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["index"], 1)
+        self.assertFalse(Product.objects.filter(name="Tea").exists())
+
+    def test_sales_batch(self):
+        response = self.post_json("api_sales_batch", {"sales": [
+            {"product_id": self.products[3].id, "quantity_sold": 2},
+            {"product_id": self.products[2].id, "quantity_sold": 1},
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["created"]), 2)
+        self.assertEqual(DailySales.objects.filter(user=self.user).count(), 2)
+
+    def test_sales_batch_rolls_back_on_insufficient_stock(self):
+        response = self.post_json("api_sales_batch", {"sales": [
+            {"product_id": self.products[3].id, "quantity_sold": 2},
+            {"product_id": self.products[1].id, "quantity_sold": 6},
+        ]})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Sale.objects.exists())
+        self.products[3].refresh_from_db()
+        self.assertEqual(self.products[3].quantity, 100)
+
+    def test_batches_reject_malformed_ids(self):
+        response = self.post_json("api_products_batch", {"products": [{"id": [1]}, {"id": True}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e["index"] for e in response.json()["errors"]], [0, 1])
+
+        response = self.post_json("api_sales_batch", {"sales": [{"product_id": [1], "quantity_sold": 1}]})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.post_json("api_sales_batch", {"sales": [
+            {"product_id": self.products[3].id, "quantity_sold": True},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_products_batch_null_and_malformed_fields(self):
+        response = self.post_json("api_products_batch", {"products": [
+            {"name": None, "quantity": 1, "buying_price": 1, "selling_price": 2},
+            {"name": "Tea", "quantity": 1, "buying_price": None, "selling_price": 2},
+            {"name": ["Tea"], "quantity": 1, "buying_price": 1, "selling_price": 2},
+            {"name": "Tea", "quantity": True, "buying_price": 1, "selling_price": 2},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [e["error"] for e in response.json()["errors"]][:3],
+            ["name is required", "buying_price must be a number", "name must be a string or a number"],
+        )
+        self.assertEqual(len(response.json()["errors"]), 4)
+        self.assertFalse(Product.objects.filter(name__in=["None", "Tea"]).exists())
+
+        response = self.post_json("api_products_batch", {"products": [
+            {"name": "Tea", "quantity": None, "reorder_level": None, "buying_price": 1, "selling_price": 2},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(name="Tea").quantity, 0)
+
+    def test_products_batch_rejects_out_of_range_counts(self):
+        response = self.post_json("api_products_batch", {"products": [
+            {"name": "Tea", "quantity": "99999999999999999999", "buying_price": 1, "selling_price": 2},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quantity", response.json()["errors"][0]["error"])
+
+    def test_sales_sync_is_idempotent(self):
+        sold_at = (timezone.now() - timedelta(hours=3)).isoformat()
+        payload = {"sales": [
+            {"key": "dev1-1", "product_id": self.products[3].id, "quantity_sold": 2, "sold_at": sold_at},
+            {"key": "dev1-2", "product_id": self.products[3].id, "quantity_sold": 3, "sold_at": sold_at},
+            {"key": "dev1-3", "product_id": self.products[2].id, "quantity_sold": 1, "sold_at": sold_at},
+        ]}
+        # One stock UPDATE covers both products
+        with CaptureQueriesContext(connection) as queries:
+            first = self.post_json("api_sales_sync", payload).json()["results"]
+        stock_updates = [q for q in queries if q["sql"].startswith('UPDATE "core_product"')]
+        self.assertEqual(len(stock_updates), 1)
+        retry = self.post_json("api_sales_sync", payload).json()["results"]
+
+        self.assertEqual([r["status"] for r in first], ["created"] * 3)
+        self.assertEqual([r["status"] for r in retry], ["duplicate"] * 3)
+        self.assertEqual([r["sale"]["id"] for r in retry], [r["sale"]["id"] for r in first])
+        self.assertEqual(Sale.objects.count(), 3)
+        self.products[3].refresh_from_db()
+        self.assertEqual(self.products[3].quantity, 95)
+        rollup = DailySales.objects.get(product=self.products[3])
+        self.assertEqual((rollup.units, rollup.transactions), (5, 2))
+
+    def test_sales_sync_reports_each_item(self):
+        now = timezone.now()
+        response = self.post_json("api_sales_sync", {"sales": [
+            {"key": "a", "product_id": self.products[1].id, "quantity_sold": 4,
+             "sold_at": (now - timedelta(minutes=5)).isoformat()},
+            {"key": "b", "product_id": self.products[1].id, "quantity_sold": 3,
+             "sold_at": (now - timedelta(minutes=1)).isoformat()},
+            {"key": "c", "product_id": self.products[1].id, "quantity_sold": 1,
+             "sold_at": (now - timedelta(minutes=10)).isoformat()},
+            {"key": "a", "product_id": self.products[1].id, "quantity_sold": 4,
+             "sold_at": (now - timedelta(minutes=5)).isoformat()},
+            {"key": "d", "product_id": 999999, "quantity_sold": 1, "sold_at": now.isoformat()},
+            {"key": "e", "product_id": self.products[3].id, "quantity_sold": 1,
+             "sold_at": (now + timedelta(days=1)).isoformat()},
+        ]})
+
+        results = response.json()["results"]
+        self.assertEqual(response.status_code, 200)
+        # The oldest sales are applied first while stock lasts
+        self.assertEqual(
+            [r["status"] for r in results],
+            ["created", "rejected", "created", "duplicate", "rejected", "rejected"],
+        )
+        self.assertIn("Not enough", results[1]["error"])
+        self.assertEqual(results[3]["sale"]["id"], results[0]["sale"]["id"])
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].quantity, 0)
+        self.assertEqual(self.products[1].stock_alert.level, StockAlert.OUT)
+
+    def test_sales_sync_keeps_device_time(self):
+        sold_at = timezone.now() - timedelta(days=2)
+        self.post_json("api_sales_sync", {"sales": [
+            {"key": "k", "product_id": self.products[3].id, "quantity_sold": 1, "sold_at": sold_at.isoformat()},
+        ]})
+        sale = Sale.objects.get(idempotency_key="k")
+        self.assertEqual(sale.created_at, sold_at)
+        self.assertEqual(DailySales.objects.get(product=self.products[3]).date, timezone.localdate(sold_at))
+
+    def test_session_writes_need_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(
+            reverse("api_sales_batch"), json.dumps({"sales": []}), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_dashboard(self):
+        self.make_sale(self.products[3], 2)
+        data = self.client.get(reverse("api_dashboard")).json()
+        self.assertEqual(Decimal(data["sales"]["total_today"]), Decimal("160"))
+        self.assertEqual(data["stock"]["out_of_stock"], 1)
+
+
+@override_settings(ROOT_URLCONF="smartbiz.urls_asgi")
+class AsyncViewTests(SmartBizTestCase):
+    COMPARED_KEYS = (
+        "total_today", "total_week", "total_all_time", "sales_count_today",
+        "low_stock_count", "out_of_stock", "in_stock_count", "daily_sales",
+    )
+
+    def sync_dashboard(self):
+        # Render afresh rather than serve the body the async view just cached
+        cache.clear()
+        with override_settings(ROOT_URLCONF="smartbiz.urls"):
+            return self.client.get(reverse("dashboard"))
+
+    async def test_dashboard_matches_sync_view(self):
+        await sync_to_async(self.make_sale)(self.products[3], 2)
+        await sync_to_async(self.make_sale)(self.products[2], 1, days_ago=3)
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse("dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.sync_dashboard)()
+        for key in self.COMPARED_KEYS:
+            self.assertEqual(response.context[key], expected.context[key], key)
+        self.assertEqual(len(response.context["sales_today"]), 1)
+
+    async def test_dashboard_lists_only_the_latest_sales(self):
+        for _ in range(7):
+            await sync_to_async(self.make_sale)(self.products[3], 1)
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse("dashboard"))
+
+        self.assertEqual(len(response.context["sales_today"]), 5)
+        self.assertContains(response, "View All Transactions")
+        self.assertIn("LIMIT 5", str(todays_sales(self.user, timezone.now().date()).query))
+
+    async def test_sales_history_and_product_list(self):
+        await sync_to_async(self.make_sale)(self.products[3], 2)
+        await self.async_client.aforce_login(self.user)
+
+        history = await self.async_client.get(reverse("sales_history"))
+        products = await self.async_client.get(reverse("product_list"), {"stock": "low"})
+
+        self.assertEqual(history.context["transactions"], 1)
+        self.assertEqual(len(history.context["sales"]), 1)
+        self.assertEqual([p.name for p in products.context["products"]], ["Item 1"])
+
+    async def test_subscription_required(self):
+        user = await User.objects.acreate_user(username="lapsed", password="pass12345")
+        await self.async_client.aforce_login(user)
+
+        response = await self.async_client.get(reverse("dashboard"))
+
+        self.assertRedirects(response, reverse("subscription_required"), fetch_redirect_response=False)
+
+    async def test_admin_dashboard_requires_staff(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("admin_dashboard"))
+        self.assertRedirects(response, reverse("login"), fetch_redirect_response=False)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_data(self):
+        call_command("seed_data", users=3, products=4, sales=5, days=10, stdout=StringIO())
+
+        owners = User.objects.filter(username__startswith="seed-", is_staff=False)
+        self.assertEqual(owners.count(), 3)
+        self.assertTrue(User.objects.get(username="seed-admin").is_staff)
+        self.assertEqual(Subscription.objects.filter(user__in=owners).count(), 3)
+        self.assertEqual(Product.objects.filter(user__in=owners).count(), 12)
+        self.assertEqual(Sale.objects.filter(user__in=owners).count(), 60)
+        oldest = Sale.objects.order_by("created_at").first().created_at
+        self.assertLess(oldest, timezone.now() - timedelta(hours=1))
+        call_command("rebuild_sales_rollup", verify=True, stdout=StringIO())
+
+        call_command("seed_data", users=1, products=1, sales=1, clear=True, stdout=StringIO())
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_bench_endpoints_report(self):
+        call_command("seed_data", users=1, products=3, sales=2, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            call_command("bench_endpoints", repeat=2, warmup=0, output=path, stdout=StringIO())
+            call_command("bench_endpoints", repeat=1, warmup=0, output=path, compare=path, stdout=StringIO())
+            with open(path) as report:
+                results = {(row["role"], row["route"]): row for row in json.load(report)["results"]}
+
+        dashboard = results[("owner", "dashboard")]
+        self.assertEqual(dashboard["status"], 200)
+        self.assertGreater(dashboard["queries"], 0)
+        self.assertLessEqual(dashboard["p50_ms"], dashboard["p99_ms"])
+        self.assertEqual(results[("admin", "admin_users")]["status"], 200)
+        self.assertNotIn(("owner", "logout"), results)
+
+
+class RequestMetricsTests(SmartBizTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics_registry.clear()
+        self.staff = User.objects.create_user(username="ops", password="pass12345", is_staff=True)
+
+    def scrape(self):
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        return {
+            line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in response.content.decode().splitlines()
+            if not line.startswith("#")
+        }
+
+    def test_records_time_queries_and_rendering_per_view(self):
+        self.make_sale(self.products[3], 1)
+        self.client.get(reverse("dashboard"))
+        self.client.get(reverse("dashboard"))
+
+        samples = self.scrape()
+        view = '{view="dashboard"}'
+        self.assertEqual(samples[f"smartbiz_request_duration_seconds_count{view}"], 2)
+        self.assertGreater(samples[f"smartbiz_request_queries_sum{view}"], 2)
+        self.assertGreater(samples[f"smartbiz_request_db_seconds_sum{view}"], 0)
+        self.assertGreater(samples[f"smartbiz_request_template_seconds_sum{view}"], 0)
+        self.assertEqual(samples['smartbiz_request_queries_bucket{view="dashboard",le="+Inf"}'], 2)
+
+    @override_settings(ROOT_URLCONF="smartbiz.urls_asgi")
+    async def test_async_views_are_recorded(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get(reverse("dashboard"))
+
+        samples = await sync_to_async(self.scrape)()
+        self.assertGreater(samples['smartbiz_request_queries_sum{view="dashboard"}'], 2)
+
+    def test_requires_staff(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Basic", response["WWW-Authenticate"])
+
+        credentials = base64.b64encode(b"ops:pass12345").decode()
+        response = Client().get(reverse("metrics"), headers={"authorization": f"Basic {credentials}"})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs("core.metrics", "WARNING") as logs:
+            self.client.get(reverse("sales_history"))
+        self.assertRegex(logs.output[0], r"GET /sales/history/ \(sales_history\) took \d+ ms with \d+ queries")
@@ -1,59 +1,144 @@
+import sys
+import time as time_module
+from datetime import datetime, time, timedelta
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
 from django.shortcuts import redirect
 from django.utils import timezone
-from .models import Product
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+    set_response_etag,
+)
+from django.utils.dateparse import parse_date
+from .models import StockAlert
+from .stats import get_user_stats
+
+
+def _subscription_redirect(user):
+    """Where to send `user` instead of a subscriber-only view, or None to let them in"""
+    if not user.is_authenticated:
+        return redirect("login")
+
+    # Admin users don't need a subscription
+    if user.is_staff or user.is_superuser:
+        return None
+
+    entitlement = get_entitlement(user)
+    if entitlement == ENTITLEMENT_NONE:
+        return redirect("subscription_required")
+    if entitlement == ENTITLEMENT_EXPIRED:
+        return redirect("subscription_expired")
+    return None
 
 
 def subscription_required(view_func):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            user = await request.auser()
+            response = await sync_to_async(_subscription_redirect)(user)
+            if response is not None:
+                return response
+            return await view_func(request, *args, **kwargs)
+
+        return _wrapped_view
+
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        user = request.user
-        if not user.is_authenticated:
-            return redirect("login")
+        response = _subscription_redirect(request.user)
+        if response is not None:
+            return response
+        return view_func(request, *args, **kwargs)
 
-        # Admin users don't need a subscription
-        if user.is_staff or user.is_superuser:
-            return view_func(request, *args, **kwargs)
+    return _wrapped_view
 
-        subscription = getattr(user, "subscription", None)
-        if subscription is None:
-            return redirect("subscription_required")
 
-        today = timezone.now().date()
-        if not subscription.is_active or subscription.end_date < today:
-            return redirect("subscription_expired")
+ENTITLEMENT_ACTIVE = "active"
+ENTITLEMENT_EXPIRED = "expired"
+ENTITLEMENT_NONE = "none"
 
-        return view_func(request, *args, **kwargs)
 
-    return _wrapped_view
+def entitlement_cache_key(user_id):
+    return f"entitlement:{user_id}"
+
+
+def invalidate_entitlement(user_id):
+    """Forget a user's cached subscription check after their subscription changes"""
+    cache.delete(entitlement_cache_key(user_id))
+
+
+def get_entitlement(user):
+    """Whether the user's subscription is active, expired or missing.
+
+    The answer is cached for a few minutes, but an active result never
+    outlives the subscription's end_date.
+    """
+    key = entitlement_cache_key(user.pk)
+    entitlement = cache.get(key)
+    if entitlement is not None:
+        return entitlement
+
+    timeout = settings.ENTITLEMENT_CACHE_TIMEOUT
+    subscription = getattr(user, "subscription", None)
+    today = timezone.now().date()
+    if subscription is None:
+        entitlement = ENTITLEMENT_NONE
+    elif not subscription.is_active or subscription.end_date < today:
+        entitlement = ENTITLEMENT_EXPIRED
+    else:
+        entitlement = ENTITLEMENT_ACTIVE
+        expires_at = timezone.make_aware(
+            datetime.combine(subscription.end_date + timedelta(days=1), time.min)
+        )
+        timeout = min(timeout, int((expires_at - timezone.now()).total_seconds()))
+
+    if timeout > 0:
+        cache.set(key, entitlement, timeout)
+    return entitlement
+
+
+def notifications_cache_key(user_id, today=None):
+    today = today or timezone.now().date()
+    return f"notifications:{user_id}:{today.isoformat()}"
+
+
+def invalidate_notifications(user_id):
+    """Drop a user's cached notifications so the next render recomputes them"""
+    cache.delete(notifications_cache_key(user_id))
 
 
 def get_notifications(request):
-    """Get notifications for the current user"""
-    notifications = []
-    
+    """Get notifications for the current user, cached until their stock or subscription changes"""
     if not request.user.is_authenticated:
-        return notifications
-    
-    # Check for low stock products
-    low_stock_products = Product.objects.filter(
-        user=request.user,
-        quantity__lt=10,
-        quantity__gt=0
-    ).count()
+        return []
+
+    key = notifications_cache_key(request.user.pk)
+    notifications = cache.get(key)
+    if notifications is None:
+        notifications = build_notifications(request.user)
+        cache.set(key, notifications, settings.NOTIFICATIONS_CACHE_TIMEOUT)
+    return notifications
+
+
+def build_notifications(user):
+    """Compute notifications for a user straight from the database"""
+    notifications = []
     
+    # Running stock counts, kept up to date as stock changes
+    stats = get_user_stats(user)
+    low_stock_products = stats.low_stock_count
     if low_stock_products > 0:
         notifications.append({
             "type": "warning",
             "message": f"⚠️ You have {low_stock_products} product(s) with low stock!"
         })
     
-    # Check for out of stock products
-    out_of_stock = Product.objects.filter(
-        user=request.user,
-        quantity=0
-    ).count()
-    
+    out_of_stock = stats.out_of_stock_count
     if out_of_stock > 0:
         notifications.append({
             "type": "danger",
@@ -61,15 +146,158 @@ def get_notifications(request):
         })
     
     # Check subscription status
-    subscription = getattr(request.user, "subscription", None)
+    subscription = getattr(user, "subscription", None)
     if subscription:
         today = timezone.now().date()
         days_left = (subscription.end_date - today).days
         
-        if 0 <= days_left <= 7:
+        # Also how owners without an email address hear about renewals
+        if 0 <= days_left <= settings.SUBSCRIPTION_REMINDER_DAYS:
             notifications.append({
                 "type": "info",
                 "message": f"ℹ️ Your subscription expires in {days_left} days. Renew now to continue!"
             })
     
     return notifications
+
+
+def data_version_cache_key(user_id):
+    return f"data-version:{user_id}"
+
+
+def get_data_version(user_id):
+    """Timestamp of the user's last product or sale write, for ETags and Last-Modified.
+
+    An unknown version (cold, evicted or expired after VERSION_CACHE_TIMEOUT)
+    starts at "now", which can only cause an extra full response, never a
+    stale 304.
+    """
+    key = data_version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time_module.time()
+        cache.add(key, version, settings.VERSION_CACHE_TIMEOUT)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_data_version(user_id):
+    """Mark the user's products/sales as changed"""
+    cache.set(data_version_cache_key(user_id), time_module.time(), settings.VERSION_CACHE_TIMEOUT)
+
+
+def dashboard_cache_key(user_id, version, today):
+    """Rendered dashboard body; a product or sale write moves the user to a new version"""
+    return f"dashboard-body:{user_id}:{version}:{today}"
+
+
+PLANS_VERSION_CACHE_KEY = "plans-version"
+
+
+def get_plans_version():
+    """Changes whenever a SubscriptionPlan is saved or deleted"""
+    version = cache.get(PLANS_VERSION_CACHE_KEY)
+    if version is None:
+        version = time_module.time()
+        cache.add(PLANS_VERSION_CACHE_KEY, version, settings.VERSION_CACHE_TIMEOUT)
+        version = cache.get(PLANS_VERSION_CACHE_KEY, version)
+    return version
+
+
+def bump_plans_version():
+    cache.set(PLANS_VERSION_CACHE_KEY, time_module.time(), settings.VERSION_CACHE_TIMEOUT)
+
+
+def cache_public_page(view_func):
+    """Serve anonymous GETs from a full-page cache that lasts until the plans change.
+
+    Cached pages carry a content-hash ETag, so a revalidating browser gets a
+    304, and a public Cache-Control header so proxies and browsers can reuse
+    them for PUBLIC_PAGE_MAX_AGE seconds. Any request with a session cookie
+    gets a fresh render, without the cost of loading the session to decide.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return view_func(request, *args, **kwargs)
+
+        key = f"public-page:{get_plans_version()}:{request.get_full_path()}"
+        response = cache.get(key)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            set_response_etag(response)
+            patch_cache_control(response, public=True, max_age=settings.PUBLIC_PAGE_MAX_AGE)
+            patch_vary_headers(response, ("Cookie",))
+            cache.set(key, response, settings.PUBLIC_PAGE_CACHE_TIMEOUT)
+        return get_conditional_response(request, etag=response.get("ETag"), response=response)
+
+    return _wrapped_view
+
+
+def get_page_size(request, default=None):
+    """Page size from ?page_size=, falling back to settings.PAGE_SIZE and capped at settings.MAX_PAGE_SIZE"""
+    default = default or settings.PAGE_SIZE
+    max_size = settings.MAX_PAGE_SIZE
+    try:
+        page_size = int(request.GET.get("page_size") or default)
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, max_size))
+
+
+def get_date_range(request):
+    """Optional ?start= and ?end= dates (YYYY-MM-DD); malformed values are ignored"""
+    dates = []
+    for key in ("start", "end"):
+        try:
+            dates.append(parse_date(request.GET.get(key) or ""))
+        except ValueError:
+            dates.append(None)
+    return tuple(dates)
+
+
+def date_range_q(start=None, end=None, field="created_at"):
+    """Q for `field` falling on or between two local dates.
+
+    Compares against datetime bounds instead of using a __date lookup so the
+    database can use an index on `field`.
+    """
+    condition = Q()
+    if start:
+        condition &= Q(**{f"{field}__gte": timezone.make_aware(datetime.combine(start, time.min))})
+    if end:
+        next_day = end + timedelta(days=1)
+        condition &= Q(**{f"{field}__lt": timezone.make_aware(datetime.combine(next_day, time.min))})
+    return condition
+
+
+# Product list / API ?stock= filters, read from the open stock alerts
+STOCK_FILTERS = {
+    "out": Q(stock_alert__level=StockAlert.OUT),
+    "low": Q(stock_alert__level=StockAlert.LOW),
+    "healthy": Q(stock_alert__isnull=True),
+}
+
+
+def prefix_q(field, prefix):
+    """Q for `field` starting with `prefix`.
+
+    Written as a half-open range so an index on `field` can serve it; a LIKE
+    pattern only uses an index under specific collations. The startswith
+    guard keeps results exact where the collation orders strings unusually.
+    """
+    if ord(prefix[-1]) == sys.maxunicode:
+        # No character sorts after the last code point to bound the range with
+        return Q(**{f"{field}__gte": prefix, f"{field}__startswith": prefix})
+    following = ord(prefix[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        # Surrogates cannot be encoded; U+E000 is the next character that can
+        following = 0xE000
+    upper = prefix[:-1] + chr(following)
+    return Q(**{
+        f"{field}__gte": prefix,
+        f"{field}__lt": upper,
+        f"{field}__startswith": prefix,
+    })
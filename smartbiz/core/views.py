@@ -1,106 +1,180 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.utils import timezone
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
 from functools import wraps
+from asgiref.sync import iscoroutinefunction
+import codecs
+import csv
 import json
-from .models import Product, Sale, Subscription, SubscriptionPlan
-from .utils import subscription_required
+from .models import DEFAULT_REORDER_LEVEL, Product, Sale, Subscription, SubscriptionPlan
+from .analytics import (
+    get_daily_sales,
+    get_platform_metrics,
+    get_sales_summary,
+    get_sales_totals,
+    get_stock_summary,
+    get_top_products,
+    refresh_platform_metrics,
+)
+from .api import basic_auth_user
+from .exports import PRODUCTS_HEADER, SALES_HEADER, csv_response, product_rows, sales_rows
+from .forecasting import reorder_suggestions
+from .imports import import_products
+from .inventory import InsufficientStock, sell_product
+from .metrics import registry as metrics_registry
+from .pagination import keyset_page
+from .reports import PERIODS, get_profit_report
+from .routers import replica_may_lag, replica_reads
+from .stats import product_allowance
+from .utils import (
+    STOCK_FILTERS,
+    cache_public_page,
+    dashboard_cache_key,
+    date_range_q,
+    get_data_version,
+    get_date_range,
+    get_page_size,
+    get_plans_version,
+    prefix_q,
+    subscription_required,
+)
+
+
+RECENT_SALES_SHOWN = 5
+
+
+def todays_sales(user, today):
+    # Only the latest few are listed; the count comes from the sales summary
+    return Sale.objects.filter(
+        date_range_q(today, today), user=user
+    ).select_related("product").order_by("-created_at")[:RECENT_SALES_SHOWN]
+
+
+def dashboard_context(summary, stock, top_products, daily_sales, sales_today, products, reorder_suggestions=()):
+    """Derive the dashboard's template context from its independent queries"""
+    total_today = summary["total_today"]
+    total_week = summary["total_week"]
+    sales_count_week = summary["sales_count_week"]
 
-
-@login_required
-@subscription_required
-def dashboard(request):
-    from datetime import timedelta
-    from django.db.models import Sum, Count, Q
-    
-    today = timezone.now().date()
-    seven_days_ago = today - timedelta(days=7)
-    thirty_days_ago = today - timedelta(days=30)
-    
-    # Today's sales
-    sales_today = Sale.objects.filter(user=request.user, created_at__date=today)
-    total_today = sales_today.aggregate(Sum('total_price'))['total_price__sum'] or 0
-    
-    # This week's sales (last 7 days)
-    sales_week = Sale.objects.filter(user=request.user, created_at__date__gte=seven_days_ago)
-    total_week = sales_week.aggregate(Sum('total_price'))['total_price__sum'] or 0
-    
-    # This month's sales (last 30 days)
-    sales_month = Sale.objects.filter(user=request.user, created_at__date__gte=thirty_days_ago)
-    total_month = sales_month.aggregate(Sum('total_price'))['total_price__sum'] or 0
-    
-    # All time sales
-    all_sales = Sale.objects.filter(user=request.user)
-    total_all_time = all_sales.aggregate(Sum('total_price'))['total_price__sum'] or 0
-    all_time_transactions = all_sales.count()
-    
     # Products metrics
-    products = Product.objects.filter(user=request.user)
-    low_stock_count = products.filter(quantity__lt=10).count()
-    out_of_stock = products.filter(quantity=0).count()
-    
-    # Top selling products
-    top_products = Sale.objects.filter(user=request.user).values('product__name').annotate(
-        total_sold=Sum('quantity_sold'),
-        revenue=Sum('total_price')
-    ).order_by('-revenue')[:5]
-    
-    # Daily sales data for chart (last 7 days)
-    daily_sales = {}
-    for i in range(7):
-        date = today - timedelta(days=6-i)
-        daily_sales[date.strftime('%a')] = Sale.objects.filter(
-            user=request.user,
-            created_at__date=date
-        ).aggregate(Sum('total_price'))['total_price__sum'] or 0
-    
+    product_count = stock["product_count"]
+    low_stock_count = stock["low_stock_count"]
+    out_of_stock = stock["out_of_stock"]
+
     # Sales trends
-    sales_count_today = sales_today.count()
-    sales_count_week = sales_week.count()
     avg_sale_value = total_week / sales_count_week if sales_count_week > 0 else 0
-    
+
     # Calculate healthy stock (not low, not out)
-    in_stock_count = products.count() - low_stock_count - out_of_stock
-    stock_health_percent = (in_stock_count / products.count() * 100) if products.count() > 0 else 0
-    
+    in_stock_count = product_count - low_stock_count - out_of_stock
+    stock_health_percent = (in_stock_count / product_count * 100) if product_count > 0 else 0
+
     # Daily average
     daily_average = (total_week - total_today) / 6 if total_week > total_today else 0
     daily_average_percent = (daily_average / total_week * 100) if total_week > 0 else 0
-    
+
     # Convert daily_sales to JSON for JavaScript
     daily_sales_json = json.dumps(daily_sales, cls=DjangoJSONEncoder)
-    
-    context = {
+
+    return {
         "sales_today": sales_today,
         "total_today": int(total_today),
         "total_week": int(total_week),
-        "total_month": int(total_month),
-        "total_all_time": int(total_all_time),
-        "all_time_transactions": all_time_transactions,
+        "total_month": int(summary["total_month"]),
+        "total_all_time": int(summary["total_all_time"]),
+        "all_time_transactions": summary["all_time_transactions"],
         "products": products,
+        "product_count": product_count,
         "low_stock_count": low_stock_count,
         "out_of_stock": out_of_stock,
         "in_stock_count": in_stock_count,
         "stock_health_percent": int(stock_health_percent),
         "top_products": top_products,
         "daily_sales": daily_sales_json,
-        "sales_count_today": sales_count_today,
+        "sales_count_today": summary["sales_count_today"],
         "sales_count_week": sales_count_week,
         "avg_sale_value": int(avg_sale_value),
         "daily_average": int(daily_average),
         "daily_average_percent": int(daily_average_percent),
+        "reorder_suggestions": reorder_suggestions,
     }
-    return render(request, "core/dashboard.html", context)
+
+
+@login_required
+@subscription_required
+@replica_reads
+def dashboard(request):
+    today = timezone.now().date()
+    version = get_data_version(request.user.id)
+    key = dashboard_cache_key(request.user.id, version, today)
+    body = cache.get(key)
+    if body is None:
+        context = dashboard_context(
+            summary=get_sales_summary(request.user, today),
+            stock=get_stock_summary(request.user),
+            top_products=get_top_products(request.user),
+            daily_sales=get_daily_sales(request.user, today),
+            sales_today=todays_sales(request.user, today),
+            products=Product.objects.filter(user=request.user),
+            reorder_suggestions=reorder_suggestions(request.user),
+        )
+        body = render_to_string("core/dashboard_body.html", context, request)
+        store_dashboard_body(key, version, body)
+    return render(request, "core/dashboard.html", {"dashboard_body": body})
+
+
+def store_dashboard_body(key, version, body):
+    """Cache a rendered dashboard body under its data version.
+
+    Skipped for a replica read just after a write: the replica may not have
+    the write yet, and the stale body would otherwise be served as current.
+    """
+    if not replica_may_lag(version):
+        cache.set(key, body, settings.DASHBOARD_CACHE_TIMEOUT)
+
+
+def product_list_filters(user, params):
+    """The product_list queryset for ?q= and ?stock=, plus the parsed filter values"""
+    query = params.get("q", "").strip()
+    stock_filter = params.get("stock", "all")
+
+    products = Product.objects.filter(user=user).select_related("forecast")
+    if query:
+        products = products.filter(prefix_q("name_lower", query.lower()))
+    if stock_filter in STOCK_FILTERS:
+        products = products.filter(STOCK_FILTERS[stock_filter])
+    return products, {"query": query, "stock_filter": stock_filter}
 
 
 @login_required
 @subscription_required
 def product_list(request):
-    products = Product.objects.filter(user=request.user)
-    return render(request, "core/product_list.html", {"products": products})
+    products, filters = product_list_filters(request.user, request.GET)
+    page_size = get_page_size(request)
+    page, next_cursor = keyset_page(
+        products,
+        ("name_lower", "id"),
+        cursor=request.GET.get("cursor"),
+        page_size=page_size,
+    )
+
+    context = {
+        "products": page,
+        "next_cursor": next_cursor,
+        "is_first_page": not request.GET.get("cursor"),
+        "page_size": page_size,
+        **filters,
+    }
+    return render(request, "core/product_list.html", context)
 
 
 @login_required
@@ -112,18 +186,49 @@ def product_create(request):
         buying_price = request.POST.get("buying_price")
         selling_price = request.POST.get("selling_price")
 
-        Product.objects.create(
-            user=request.user,
-            name=name,
-            quantity=int(quantity),
-            buying_price=buying_price,
-            selling_price=selling_price,
-        )
+        with transaction.atomic():
+            # Reads the running product count, so the limit costs no COUNT query
+            allowance = product_allowance(request.user)
+            if allowance == 0:
+                return render(request, "core/product_form.html", {
+                    "error": "You have reached your plan's product limit.",
+                })
+            Product.objects.create(
+                user=request.user,
+                name=name,
+                quantity=int(quantity),
+                reorder_level=int(request.POST.get("reorder_level") or DEFAULT_REORDER_LEVEL),
+                buying_price=buying_price,
+                selling_price=selling_price,
+            )
         return redirect("product_list")
 
     return render(request, "core/product_form.html")
 
 
+@login_required
+@subscription_required
+def product_import(request):
+    context = {}
+
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if upload is None:
+            context["error"] = "Choose a CSV file to import"
+        else:
+            lines = codecs.iterdecode(upload, "utf-8-sig")
+            try:
+                context["result"] = import_products(
+                    request.user, lines, batch_size=settings.PRODUCT_IMPORT_BATCH_SIZE
+                )
+            except UnicodeDecodeError:
+                context["error"] = "The file must be UTF-8 encoded CSV"
+            except csv.Error as exc:
+                context["error"] = f"The file is not valid CSV: {exc}"
+
+    return render(request, "core/product_import.html", context)
+
+
 @login_required
 @subscription_required
 def product_edit(request, product_id):
@@ -132,6 +237,7 @@ def product_edit(request, product_id):
     if request.method == "POST":
         product.name = request.POST.get("name")
         product.quantity = int(request.POST.get("quantity") or 0)
+        product.reorder_level = int(request.POST.get("reorder_level") or DEFAULT_REORDER_LEVEL)
         product.buying_price = request.POST.get("buying_price")
         product.selling_price = request.POST.get("selling_price")
         product.save()
@@ -157,24 +263,32 @@ def product_delete(request, product_id):
 def record_sale(request, product_id):
     product = get_object_or_404(Product, id=product_id, user=request.user)
 
+    error = None
+
     if request.method == "POST":
         quantity_sold = int(request.POST.get("quantity_sold") or 0)
-        if quantity_sold > 0 and quantity_sold <= product.quantity:
-            total_price = quantity_sold * product.selling_price
-
-            Sale.objects.create(
-                user=request.user,
-                product=product,
-                quantity_sold=quantity_sold,
-                total_price=total_price,
-            )
+        if quantity_sold > 0:
+            try:
+                sell_product(product, quantity_sold)
+            except InsufficientStock as exc:
+                error = str(exc)
+                product.refresh_from_db(fields=["quantity"])
+            else:
+                return redirect("dashboard")
 
-            product.quantity -= quantity_sold
-            product.save()
+    return render(request, "core/record_sale.html", {"product": product, "error": error})
 
-            return redirect("dashboard")
 
-    return render(request, "core/record_sale.html", {"product": product})
+@login_required
+@subscription_required
+@replica_reads
+def profit_report(request):
+    start, end = get_date_range(request)
+    period = request.GET.get("period")
+    if period not in PERIODS:
+        period = "month"
+    report = get_profit_report(request.user, start, end, period)
+    return render(request, "core/profit_report.html", {**report, "period_choices": PERIODS})
 
 
 @login_required
@@ -187,11 +301,59 @@ def subscription_expired_view(request):
     return render(request, "core/subscription_expired.html")
 
 
+def sales_history_filters(user, request):
+    """The sales_history queryset for ?start=, ?end= and ?product=, plus the parsed filter values"""
+    start, end = get_date_range(request)
+    product_id = request.GET.get("product")
+    product_id = int(product_id) if product_id and product_id.isdigit() else None
+
+    sales = Sale.objects.filter(user=user).filter(date_range_q(start, end))
+    if product_id:
+        sales = sales.filter(product_id=product_id)
+    return sales.select_related("product"), {"start": start, "end": end, "product_id": product_id}
+
+
+def sales_history_products(user):
+    return Product.objects.filter(user=user).order_by("name").values("id", "name")
+
+
 @login_required
 @subscription_required
+@replica_reads
 def sales_history(request):
-    sales = Sale.objects.filter(user=request.user).order_by("-created_at")
-    return render(request, "core/sales_history.html", {"sales": sales})
+    sales, filters = sales_history_filters(request.user, request)
+    page_size = get_page_size(request, settings.SALES_HISTORY_PAGE_SIZE)
+    page, next_cursor = keyset_page(
+        sales,
+        ("-created_at", "-id"),
+        cursor=request.GET.get("cursor"),
+        page_size=page_size,
+    )
+
+    context = {
+        "sales": page,
+        "next_cursor": next_cursor,
+        "is_first_page": not request.GET.get("cursor"),
+        "page_size": page_size,
+        **filters,
+        "products": sales_history_products(request.user),
+        **get_sales_totals(request.user, filters["start"], filters["end"], filters["product_id"]),
+    }
+    return render(request, "core/sales_history.html", context)
+
+
+@login_required
+@subscription_required
+def export_sales(request):
+    start, end = get_date_range(request)
+    return csv_response("sales.csv", SALES_HEADER, sales_rows(request.user, start, end))
+
+
+@login_required
+@subscription_required
+def export_products(request):
+    start, end = get_date_range(request)
+    return csv_response("products.csv", PRODUCTS_HEADER, product_rows(request.user, start, end))
 
 
 def register(request):
@@ -235,6 +397,9 @@ def subscription_plans(request):
     context = {
         "plans": plans,
         "user_subscription": user_subscription,
+        # The plan cards are a cached fragment keyed on this
+        "plans_version": get_plans_version(),
+        "plans_cache_timeout": settings.PUBLIC_PAGE_CACHE_TIMEOUT,
     }
     return render(request, "core/subscription_plans.html", context)
 
@@ -271,6 +436,7 @@ def subscription_status(request):
     return render(request, "core/subscription_status.html", context)
 
 
+@cache_public_page
 def landing_page(request):
     """Public landing page for non-authenticated users"""
     context = {}
@@ -279,11 +445,23 @@ def landing_page(request):
 
 # ========== ADMIN VIEWS ==========
 
+def is_admin(user):
+    return user.is_authenticated and (user.is_staff or user.is_superuser)
+
+
 def admin_required(view_func):
     """Decorator to require admin/staff access"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            if not is_admin(await request.auser()):
+                return redirect("login")
+            return await view_func(request, *args, **kwargs)
+        return _wrapped_view
+
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
+        if not is_admin(request.user):
             return redirect("login")
         return view_func(request, *args, **kwargs)
     return _wrapped_view
@@ -291,52 +469,76 @@ def admin_required(view_func):
 
 @login_required
 @admin_required
+@replica_reads
 def admin_dashboard(request):
     """Admin dashboard with statistics"""
-    # Get all users except superusers/staff (business owners)
-    business_owners = User.objects.filter(is_staff=False, is_superuser=False)
-    total_users = business_owners.count()
-    
-    # Subscription stats
-    total_subscriptions = Subscription.objects.count()
-    active_subscriptions = Subscription.objects.filter(is_active=True).count()
-    expired_subscriptions = Subscription.objects.filter(is_active=False).count()
-    
-    # Revenue calculation
-    active_subs = Subscription.objects.filter(is_active=True)
-    total_revenue = sum(sub.plan.price for sub in active_subs)
-    
-    # Due subscriptions (ending within 7 days)
-    today = timezone.now().date()
-    due_date = today + timezone.timedelta(days=7)
-    due_subscriptions = Subscription.objects.filter(
-        is_active=True,
-        end_date__lte=due_date,
-        end_date__gte=today
-    ).count()
-    
-    # Inactive users
-    inactive_users = business_owners.filter(is_active=False).count()
-    
-    context = {
-        "total_users": total_users,
-        "active_users": business_owners.filter(is_active=True).count(),
-        "inactive_users": inactive_users,
-        "total_subscriptions": total_subscriptions,
-        "active_subscriptions": active_subscriptions,
-        "expired_subscriptions": expired_subscriptions,
-        "total_revenue": total_revenue,
-        "due_subscriptions": due_subscriptions,
+    if request.GET.get("refresh"):
+        metrics = refresh_platform_metrics()
+    else:
+        metrics = get_platform_metrics()
+    return render(request, "core/admin_dashboard.html", metrics)
+
+
+# Sort options for the admin lists; each ordering ends in the primary key for keyset paging
+ADMIN_USER_SORTS = {
+    "newest": ("-date_joined", "-id"),
+    "oldest": ("date_joined", "id"),
+    "username": ("username", "id"),
+    "products": ("-product_count", "-id"),
+    "sales": ("-sale_count", "-id"),
+}
+ADMIN_SUBSCRIPTION_SORTS = {
+    "ending_last": ("-end_date", "-id"),
+    "ending_soon": ("end_date", "id"),
+    "newest": ("-start_date", "-id"),
+    "username": ("username", "id"),
+}
+
+
+def account_search_q(query, prefix=""):
+    """Q for accounts whose username or email starts with `query`"""
+    return Q(**{f"{prefix}username__istartswith": query}) | Q(**{f"{prefix}email__istartswith": query})
+
+
+def admin_list_page(request, queryset, sorts, default_sort):
+    """One keyset page of an admin list for ?sort=, plus the paging context"""
+    sort = request.GET.get("sort")
+    if sort not in sorts:
+        sort = default_sort
+    page_size = get_page_size(request)
+    page, next_cursor = keyset_page(
+        queryset, sorts[sort], cursor=request.GET.get("cursor"), page_size=page_size
+    )
+    return page, {
+        "sort": sort,
+        "next_cursor": next_cursor,
+        "is_first_page": not request.GET.get("cursor"),
+        "page_size": page_size,
     }
-    return render(request, "core/admin_dashboard.html", context)
 
 
 @login_required
 @admin_required
+@replica_reads
 def admin_users(request):
-    """Manage business owner accounts"""
-    business_owners = User.objects.filter(is_staff=False, is_superuser=False).prefetch_related('subscription')
-    
+    """Manage business owner accounts, a page at a time.
+
+    Each page is one query: the subscription and plan are joined in, and
+    the product and sale counts come from the joined UserStats row.
+    """
+    business_owners = (
+        User.objects.filter(is_staff=False, is_superuser=False)
+        .select_related("subscription__plan")
+        .annotate(
+            product_count=Coalesce("stats__product_count", 0),
+            sale_count=Coalesce("stats__sale_count", 0),
+        )
+    )
+
+    query = request.GET.get("q", "").strip()
+    if query:
+        business_owners = business_owners.filter(account_search_q(query))
+
     # Filter by status
     status_filter = request.GET.get('status', 'all')
     if status_filter == 'active':
@@ -352,21 +554,33 @@ def admin_users(request):
         business_owners = business_owners.filter(subscription__is_active=False)
     elif sub_filter == 'none':
         business_owners = business_owners.filter(subscription__isnull=True)
-    
+
+    page, paging = admin_list_page(request, business_owners, ADMIN_USER_SORTS, "newest")
     context = {
-        "users": business_owners,
+        "users": page,
+        "query": query,
         "status_filter": status_filter,
         "sub_filter": sub_filter,
+        **paging,
     }
     return render(request, "core/admin_users.html", context)
 
 
 @login_required
 @admin_required
+@replica_reads
 def admin_subscriptions(request):
-    """Manage subscriptions"""
-    subscriptions = Subscription.objects.select_related('user', 'plan').order_by('-end_date')
-    
+    """Manage subscriptions, a page at a time, in one joined query per page"""
+    subscriptions = Subscription.objects.select_related('user', 'plan').annotate(
+        username=F("user__username"),
+        product_count=Coalesce("user__stats__product_count", 0),
+        sale_count=Coalesce("user__stats__sale_count", 0),
+    )
+
+    query = request.GET.get("q", "").strip()
+    if query:
+        subscriptions = subscriptions.filter(account_search_q(query, prefix="user__"))
+
     # Filter by status
     status_filter = request.GET.get('status', 'all')
     if status_filter == 'active':
@@ -384,11 +598,14 @@ def admin_subscriptions(request):
             end_date__lte=due_date,
             end_date__gte=today
         )
-    
+
+    page, paging = admin_list_page(request, subscriptions, ADMIN_SUBSCRIPTION_SORTS, "ending_last")
     context = {
-        "subscriptions": subscriptions,
+        "subscriptions": page,
+        "query": query,
         "status_filter": status_filter,
         "due_filter": due_filter,
+        **paging,
     }
     return render(request, "core/admin_subscriptions.html", context)
 
@@ -421,3 +638,13 @@ def toggle_subscription_status(request, subscription_id):
     
     context = {"subscription": subscription}
     return render(request, "core/confirm_action.html", context)
+
+
+def metrics(request):
+    """Per-view request metrics in Prometheus text format, for staff sessions or HTTP Basic scrapers"""
+    user = basic_auth_user(request) or request.user
+    if not is_admin(user):
+        response = HttpResponse("Staff credentials required\n", status=401, content_type="text/plain")
+        response["WWW-Authenticate"] = 'Basic realm="SmartBiz metrics"'
+        return response
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,20 +42,24 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.PrimaryPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'smartbiz.urls'
+# asgi.py selects smartbiz.urls_asgi, which serves the async views
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'smartbiz.urls')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timed for the per-view metrics at /metrics/
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR/"templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,13 +79,80 @@ WSGI_APPLICATION = 'smartbiz.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+#
+# DB_PROFILE picks one of DATABASE_PROFILES. Connections are kept open for
+# CONN_MAX_AGE seconds and health-checked before reuse.
+
+CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+DATABASE_PROFILES = {
+    # WAL lets readers continue while a sale is being written; IMMEDIATE
+    # transactions take the write lock up front, so concurrent writers queue
+    # on busy_timeout instead of failing with "database is locked".
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA busy_timeout=5000;'
+                'PRAGMA cache_size=-20000;'
+            ),
+        },
+    },
+    # Stock Django SQLite settings, kept for `manage.py bench_db_profiles`
+    'sqlite-baseline': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=DELETE;',
+        },
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'smartbiz'),
+        'USER': os.environ.get('DB_USER', 'smartbiz'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
+    },
 }
 
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+DATABASES = {
+    'default': DATABASE_PROFILES[DB_PROFILE],
+}
+
+# Optional read replica for analytics and admin pages (see core/routers.py).
+# Set DB_REPLICA_NAME (a second SQLite file, refreshed with
+# `manage.py sync_sqlite_replica`) or DB_REPLICA_HOST for PostgreSQL.
+REPLICA_DATABASE = None
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASE = 'replica'
+    if 'DB_REPLICA_HOST' in os.environ:
+        DATABASES['replica']['HOST'] = os.environ['DB_REPLICA_HOST']
+        DATABASES['replica']['PORT'] = os.environ.get('DB_REPLICA_PORT', DATABASES['default'].get('PORT', ''))
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# After a write, how long a client keeps reading from the primary
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -122,3 +194,93 @@ STATICFILES_DIRS = [BASE_DIR/"static"]
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "login"
+
+# Pagination (list views accept ?page_size= up to MAX_PAGE_SIZE)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SALES_HISTORY_PAGE_SIZE = 50
+
+# Cache. Set REDIS_URL (and `pip install redis`) whenever more than one
+# worker process serves requests: the default cache is per process, so a
+# write handled by one worker is not seen by the others' cached versions.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# How long a user's data version (ETags, cached dashboards and reports) and
+# the plans version live without being bumped. With a shared cache they can
+# live until the next write; with the per-process cache they expire after a
+# few minutes, which bounds how long another worker's write can go unseen.
+VERSION_CACHE_TIMEOUT = None if os.environ.get('REDIS_URL') else 60 * 5
+
+# A user's cached subscription check (never kept past the subscription's
+# end date) and notification list, both dropped when the underlying data changes
+ENTITLEMENT_CACHE_TIMEOUT = 60 * 5
+NOTIFICATIONS_CACHE_TIMEOUT = 60 * 15
+
+# How long the admin dashboard serves a metrics snapshot before recomputing it.
+# Run `manage.py refresh_platform_metrics` from cron more often than this to
+# keep the page from ever computing metrics inline. That needs REDIS_URL: with
+# the per-process cache the cron job's snapshot never reaches the web workers,
+# so the command refuses to run.
+PLATFORM_METRICS_CACHE_TIMEOUT = 60 * 10
+
+# `manage.py expire_subscriptions` emails owners this many days before their
+# subscription ends, in chunks of SUBSCRIPTION_REMINDER_CHUNK_SIZE
+SUBSCRIPTION_REMINDER_DAYS = 7
+SUBSCRIPTION_REMINDER_CHUNK_SIZE = 500
+
+# Email. Reminders are printed to the console until EMAIL_BACKEND and the
+# EMAIL_HOST settings point at a real mail server.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'SmartBiz <noreply@smartbiz.local>')
+
+# `manage.py forecast_demand`: days of sales history used, exponential
+# smoothing factor, supplier lead time and days of demand per order, safety
+# stock in standard deviations (1.65 covers ~95% of days), products per batch
+FORECAST_HISTORY_DAYS = 56
+FORECAST_SMOOTHING = 0.2
+FORECAST_LEAD_TIME_DAYS = 7
+FORECAST_ORDER_DAYS = 14
+FORECAST_SERVICE_Z = 1.65
+FORECAST_BATCH_SIZE = 2000
+
+# Rows per INSERT when importing products from CSV
+PRODUCT_IMPORT_BATCH_SIZE = 500
+
+# Most items accepted by one JSON API batch request
+API_MAX_BATCH_SIZE = 500
+
+# Offline sales uploaded to /api/sales/sync/ may be stamped at most this
+# many seconds ahead of the server clock, and no more than this many days ago
+SALE_SYNC_CLOCK_SKEW = 300
+SALE_SYNC_MAX_AGE_DAYS = 30
+
+# Requests slower than this are logged by core.metrics with their query count
+SLOW_REQUEST_THRESHOLD_MS = 500
+
+# Anonymous full-page cache (landing page): kept until the plans change or
+# this many seconds pass; browsers and proxies may reuse a copy for MAX_AGE
+PUBLIC_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+PUBLIC_PAGE_MAX_AGE = 60 * 5
+
+# Rendered dashboard body per user, replaced on the user's next product or sale write
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Computed profit reports per user and date range, replaced the same way
+REPORT_CACHE_TIMEOUT = 60 * 60
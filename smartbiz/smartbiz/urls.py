@@ -18,6 +18,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
+from core import api as core_api
 from core import views as core_views
 
 urlpatterns = [
@@ -32,10 +33,14 @@ urlpatterns = [
     path("dashboard/", core_views.dashboard, name="dashboard"),
     path("products/", core_views.product_list, name="product_list"),
     path("products/new/", core_views.product_create, name="product_create"),
+    path("products/import/", core_views.product_import, name="product_import"),
+    path("products/export/", core_views.export_products, name="export_products"),
     path("products/<int:product_id>/edit/", core_views.product_edit, name="product_edit"),
     path("products/<int:product_id>/delete/", core_views.product_delete, name="product_delete"),
     path("products/<int:product_id>/sale/", core_views.record_sale, name="record_sale"),
     path("sales/history/", core_views.sales_history, name="sales_history"),
+    path("sales/export/", core_views.export_sales, name="export_sales"),
+    path("reports/profit/", core_views.profit_report, name="profit_report"),
 
     path("subscription/required/", core_views.subscription_required_view, name="subscription_required"),
     path("subscription/expired/", core_views.subscription_expired_view, name="subscription_expired"),
@@ -43,11 +48,20 @@ urlpatterns = [
     path("subscription/plans/<int:plan_id>/renew/", core_views.renew_subscription, name="renew_subscription"),
     path("subscription/status/", core_views.subscription_status, name="subscription_status"),
 
+    # JSON API
+    path("api/products/", core_api.products, name="api_products"),
+    path("api/products/batch/", core_api.products_batch, name="api_products_batch"),
+    path("api/sales/", core_api.sales, name="api_sales"),
+    path("api/sales/batch/", core_api.sales_batch, name="api_sales_batch"),
+    path("api/sales/sync/", core_api.sales_sync, name="api_sales_sync"),
+    path("api/dashboard/", core_api.dashboard, name="api_dashboard"),
+
     # Admin Routes
     path("admin-dashboard/", core_views.admin_dashboard, name="admin_dashboard"),
     path("admin-users/", core_views.admin_users, name="admin_users"),
     path("admin-subscriptions/", core_views.admin_subscriptions, name="admin_subscriptions"),
     path("admin-users/<int:user_id>/toggle/", core_views.toggle_user_status, name="toggle_user_status"),
     path("admin-subscriptions/<int:subscription_id>/toggle/", core_views.toggle_subscription_status, name="toggle_subscription_status"),
+    path("metrics/", core_views.metrics, name="metrics"),
 ]
 
@@ -0,0 +1,26 @@
+"""
+URL configuration for the ASGI entry point.
+
+Same routes as smartbiz.urls, with the read-heavy pages served by the
+async views in core.async_views. The CSV exports are async too, so
+they stream under ASGI instead of being buffered whole.
+"""
+
+from django.urls import path
+from core import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    "dashboard": async_views.dashboard,
+    "product_list": async_views.product_list,
+    "sales_history": async_views.sales_history,
+    "admin_dashboard": async_views.admin_dashboard,
+    "export_sales": async_views.export_sales,
+    "export_products": async_views.export_products,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if getattr(pattern, "name", None) in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]